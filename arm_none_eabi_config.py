@@ -1,7 +1,4 @@
-import os
-import subprocess
-
-from assembler import Assembler
+from assembler import GnuAssembler
 
 output_file = "./arm-none-eabi-insts.h"
 
@@ -60,7 +57,7 @@ test_cases = [
     ("blx", {"reg": 5}, "blx r5"),
 ]
 
-class ArmNoneEabiAssembler(Assembler):
+class ArmNoneEabiAssembler(GnuAssembler):
     """arm-none-eabi assembler (for r/pi)"""
 
     def __init__(self, config_dict):
@@ -70,58 +67,11 @@ class ArmNoneEabiAssembler(Assembler):
             config_dict: A dictionary containing the assembler configuration.
         """
 
-        self.memmap = config_dict["memmap"]
-        self.asm_file = config_dict["filepath"] + ".S"
-        self.obj_file = config_dict["filepath"] + ".o"
-        self.bin_file = config_dict["filepath"] + ".bin"
-
-
-    def assemble(self, instruction):
-        """Assembles a given file and returns the resulting binary.
-
-        Args:
-            filename (str): The name of the file to assemble.
-
-        Returns:
-            bytes: The assembled binary.
-        """
-
-        # Create temporary assembly file
-        with open(self.asm_file, "w+") as f:
-            f.write(instruction + "\n")
-
-        
-        # Assemble the file
-        retcode = subprocess.call(["arm-none-eabi-as", "--warn", "-mcpu=arm1176jzf-s", "-march=armv6zk", self.asm_file, "-o", self.obj_file])
-        if retcode != 0:
-            raise RuntimeError(f"Error assembling instruction: `{instruction}`")
-
-        # Link the object file into a binary
-        retcode = subprocess.call(["arm-none-eabi-objcopy", self.obj_file, "-O", "binary", self.bin_file])
-        if retcode != 0:
-            raise RuntimeError(f"Error objcopying: `{self.obj_file}`")
-
-        # Read the binary
-        with open(self.bin_file, "rb") as f:
-            binary = f.read()
-
-        if (len(binary) != 4):
-            raise RuntimeError(f"Expected 4 byte instruction but got {len(binary)} bytes!")
-
-        # convert from little endian
-        return bytes([binary[3], binary[2], binary[1], binary[0]])
-
-
-    def cleanup(self):
-        """Cleans up any temporary files created during the assembly process."""
-
-        os.remove(self.asm_file)
-        os.remove(self.obj_file)
-        os.remove(self.bin_file)
+        super().__init__(config_dict)
+        self.as_command = ["arm-none-eabi-as", "--warn", "-mcpu=arm1176jzf-s", "-march=armv6zk", "-"]
 
     def arch(self):
         """Returns a string denoting the assembler architecture."""
         return "arm"
 
-asm = ArmNoneEabiAssembler({"memmap": "memmap",
-                            "filepath": "./test"})
+asm = ArmNoneEabiAssembler({"memmap": "memmap"})
@@ -1,7 +1,170 @@
 import abc
+import asyncio
+import itertools
+import mmap
+import re
+import struct
 import subprocess
 import os
 import sys
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# {Assembler: threading.Lock} serializing the default assemble_many_async() of each assembler,
+# kept outside the instances since Assembler.__init__ is abstract and subclasses may use slots
+async_locks = weakref.WeakKeyDictionary()
+async_locks_guard = threading.Lock()
+
+# {tool_fingerprint() of a compiler driver: the assembler it runs, "" if unknown}, see driver_assembler();
+# ProbeCache keeps it across runs
+driver_programs = {}
+
+class RejectedError(RuntimeError):
+    """Raised by Assembler.assemble_many when the assembler rejected some instructions of a batch.
+
+    Other RuntimeErrors mean that the toolchain itself failed, e.g. crashed
+    or could not write its output, and say nothing about the instructions.
+    """
+
+    def __init__(self, message, rejected=None):
+        """Creates the error.
+
+        Args:
+            message (str): The error message.
+            rejected (list(int) | None): The positions in the batch of the rejected instructions, sorted,
+                or None if the assembler did not say which instructions it rejected.
+        """
+        super().__init__(message)
+        self.rejected = rejected
+
+def tool_fingerprint(tool):
+    """Identifies an installed tool without running it.
+
+    The resolved path, size and modification time of the executable change
+    whenever the toolchain is upgraded or reinstalled, which makes them a
+    stand-in for its version that costs no subprocess.
+
+    Args:
+        tool (str): The name of the tool to look up on PATH.
+
+    Returns:
+        str: A string identifying the installed tool.
+    """
+    path = shutil.which(tool)
+    if path is None:
+        return f"{tool}:missing"
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def driver_assembler(driver):
+    """Asks a compiler driver such as gcc which assembler it runs.
+
+    The answer is remembered in driver_programs under the fingerprint of the
+    driver, so the driver only runs again once it is reinstalled.
+
+    Args:
+        driver (str): The name or path of the driver.
+
+    Returns:
+        str | None: The name or path of the assembler, or None if the driver cannot tell.
+    """
+    fingerprint = tool_fingerprint(driver)
+    if fingerprint not in driver_programs:
+        program = ""
+        try:
+            result = subprocess.run([driver, "-print-prog-name=as"], capture_output=True, timeout=30)
+            if result.returncode == 0:
+                program = result.stdout.decode(errors="replace").strip()
+        except (OSError, subprocess.SubprocessError):
+            pass
+        driver_programs[fingerprint] = program
+    return driver_programs[fingerprint] or None
+
+def scratch_root():
+    """Returns the directory to create scratch directories in, preferring tmpfs.
+
+    Returns:
+        str | None: /dev/shm if it is usable, otherwise None (the default temporary directory).
+    """
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+def elf_section(image, name):
+    """Finds a section of an ELF32 or ELF64 file.
+
+    Args:
+        image (memoryview): The contents of the ELF file.
+        name (str): The name of the section, e.g. ".text".
+
+    Raises:
+        RuntimeError: The image is not an ELF file or has no such section.
+
+    Returns:
+        tuple(memoryview, str): The contents of the section (a view into image, not a copy)
+            and the byte order of the file ("little" or "big").
+    """
+    if bytes(image[:4]) != b"\x7fELF":
+        raise RuntimeError("Not an ELF file")
+
+    elf_class = image[4]
+    byteorder = {1: "little", 2: "big"}.get(image[5])
+    if byteorder is None:
+        raise RuntimeError(f"Unknown ELF byte order {image[5]}")
+    endian = "<" if byteorder == "little" else ">"
+
+    if elf_class == 1:
+        e_shoff, = struct.unpack_from(endian + "I", image, 0x20)
+        e_shentsize, e_shnum, e_shstrndx = struct.unpack_from(endian + "HHH", image, 0x2E)
+        # sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size
+        section_format = endian + "IIIIII"
+    elif elf_class == 2:
+        e_shoff, = struct.unpack_from(endian + "Q", image, 0x28)
+        e_shentsize, e_shnum, e_shstrndx = struct.unpack_from(endian + "HHH", image, 0x3A)
+        section_format = endian + "IIQQQQ"
+    else:
+        raise RuntimeError(f"Unknown ELF class {elf_class}")
+
+    sections = [struct.unpack_from(section_format, image, e_shoff + i * e_shentsize) for i in range(e_shnum)]
+    if e_shstrndx >= len(sections):
+        raise RuntimeError("ELF file has no section name table")
+    names_offset = sections[e_shstrndx][4]
+
+    wanted = name.encode() + b"\0"
+    for sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size in sections:
+        start = names_offset + sh_name
+        if image[start:start + len(wanted)] == wanted:
+            return image[sh_offset:sh_offset + sh_size], byteorder
+    raise RuntimeError(f"ELF file has no {name} section")
+
+def read_elf_section(path, name=".text"):
+    """Reads a section out of an ELF32 or ELF64 file through an mmap.
+
+    Only the section itself is copied out of the file.
+
+    Args:
+        path (str): The ELF file, e.g. an object file produced by an assembler.
+        name (str): The name of the section.
+
+    Raises:
+        RuntimeError: The file is not an ELF file or has no such section.
+
+    Returns:
+        tuple(bytes, str): The contents of the section and the byte order of the file.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+            view = memoryview(image)
+            try:
+                section, byteorder = elf_section(view, name)
+                contents = bytes(section)
+                section.release()
+            finally:
+                view.release()
+    return contents, byteorder
 
 class Assembler(abc.ABC):
     """Abstract base class representing an assembler."""
@@ -25,12 +188,99 @@ class Assembler(abc.ABC):
         Args:
             filename (str): The name of the file to assemble.
 
+        Raises:
+            RuntimeError: The toolchain failed (RejectedError if the assembler rejected the instruction).
+
         Returns:
             bytes: The assembled binary.
         """
         
         raise NotImplementedError("Subclasses must implement Assembler.assemble!")
 
+    def assemble_many(self, instructions):
+        """Assembles a list of instructions and returns the binary of each one.
+
+        Subclasses should override this to assemble the whole list in a single
+        toolchain invocation; the default falls back to one assemble() call per
+        instruction. If the assembler rejects some of the instructions, this
+        raises a RejectedError, naming them if possible, which lets derive.py
+        assemble the others in one more batch instead of bisecting the batch.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Raises:
+            RuntimeError: The toolchain failed (RejectedError if the assembler rejected instructions).
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        binaries = []
+        rejected = []
+        for i, instruction in enumerate(instructions):
+            try:
+                binaries.append(self.assemble(instruction))
+            except RejectedError:
+                rejected.append(i)
+        if len(rejected) > 0:
+            raise RejectedError(f"The assembler rejected {len(rejected)} of {len(instructions)} instructions", rejected)
+        return binaries
+
+    async def assemble_async(self, instruction):
+        """Assembles a given instruction without blocking the event loop.
+
+        Args:
+            instruction (str): The instruction to assemble.
+
+        Returns:
+            bytes: The assembled binary.
+        """
+        return (await self.assemble_many_async([instruction]))[0]
+
+    async def assemble_many_async(self, instructions):
+        """Assembles a list of instructions without blocking the event loop.
+
+        Subclasses that can run several batches at once should override this.
+        The default runs assemble_many() on the event loop's default executor,
+        one batch at a time, since synchronous assemblers usually reuse the
+        same temporary files for every call.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        with async_locks_guard:
+            lock = async_locks.get(self)
+            if lock is None:
+                lock = async_locks[self] = threading.Lock()
+
+        def assemble_many_locked():
+            with lock:
+                return self.assemble_many(instructions)
+
+        return await asyncio.get_running_loop().run_in_executor(None, assemble_many_locked)
+
+    def clone(self, filepath):
+        """Creates an assembler with the same configuration that keeps its temporary files at filepath.
+
+        Args:
+            filepath (str): Path prefix for the temporary files of the new assembler.
+
+        Returns:
+            Assembler: The new assembler.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support Assembler.clone!")
+
+    def identity(self):
+        """Returns a string identifying everything that determines the assembled output.
+
+        Subclasses should extend this with their tool command lines and
+        toolchain versions; it is used to key cached binaries.
+        """
+        return f"{type(self).__module__}.{type(self).__qualname__}:{self.arch()}"
+
     @abc.abstractmethod
     def cleanup(self):
         """Cleans up any temporary files created during the assembly process."""
@@ -40,3 +290,316 @@ class Assembler(abc.ABC):
     def arch(self):
         """Returns a string denoting the assembler architecture."""
         raise NotImplementedError("Subclasses must implement Assembler.arch!")
+
+class GnuAssembler(Assembler):
+    """Base class for assemblers that drive a GNU toolchain.
+
+    The source is piped to the assembler over stdin, the object file goes
+    to a scratch directory private to this instance (on tmpfs when
+    available), and the machine code is read straight out of its .text
+    section, so there is one process launch per batch and nothing is
+    written to the working directory.
+
+    Subclasses set as_command (ending in the argument that makes the tool
+    read stdin) in __init__, may override n_bytes and byteorder, and
+    implement arch().
+    """
+
+    # size of every instruction in bytes
+    n_bytes = 4
+    # byte order of the instructions in .text, None to use the byte order of the object file
+    byteorder = None
+
+    def __init__(self, config_dict):
+        """Sets up the assembler.
+
+        Args:
+            config_dict: A dictionary containing the assembler configuration. If it has a
+                "filepath" entry, the temporary files are kept at that path prefix instead
+                of in a private scratch directory.
+        """
+        self.config_dict = config_dict
+        self.memmap = config_dict.get("memmap")
+        self.scratch_dir = None
+        self.as_command = None
+        # output of identity(), computed once since it looks up (and may run) the tools
+        self.cached_identity = None
+        # numbers the object files of concurrent assemble_many_async() calls
+        self.async_ids = itertools.count()
+        self.set_filepath(config_dict.get("filepath"))
+
+    def set_filepath(self, filepath):
+        """Points the temporary files at filepath, or at a private scratch directory if None."""
+        self.filepath = filepath
+        if filepath is None:
+            self.obj_file = None
+        else:
+            self.obj_file = filepath + ".o"
+
+    def assemble(self, instruction):
+        """Assembles a given instruction and returns the resulting binary.
+
+        Args:
+            instruction (str): The instruction to assemble.
+
+        Returns:
+            bytes: The assembled binary.
+        """
+        return self.assemble_many([instruction])[0]
+
+    def assemble_many(self, instructions):
+        """Assembles a list of instructions in a single toolchain invocation.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order (big endian).
+        """
+
+        if len(instructions) == 0:
+            return []
+        self.make_scratch_dir()
+
+        # Assemble the source, piped in one instruction per line
+        source = "".join(instruction + "\n" for instruction in instructions)
+        result = subprocess.run(self.as_command + ["-o", self.obj_file], input=source.encode(), capture_output=True)
+        if result.returncode != 0:
+            raise self.assembly_error(instructions, result.stderr, result.returncode)
+
+        # Read the machine code out of the object file
+        binary, byteorder = read_elf_section(self.obj_file, ".text")
+
+        return self.split_binary(binary, len(instructions), self.byteorder or byteorder)
+
+    async def assemble_many_async(self, instructions):
+        """Assembles a list of instructions in a single toolchain invocation without blocking the event loop.
+
+        Every call writes its own object file, so any number of calls can run at once.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order (big endian).
+        """
+        if len(instructions) == 0:
+            return []
+        self.make_scratch_dir()
+
+        obj_file = f"{self.filepath}.{next(self.async_ids)}.o"
+        source = "".join(instruction + "\n" for instruction in instructions)
+        try:
+            process = await asyncio.create_subprocess_exec(*self.as_command, "-o", obj_file,
+                                                           stdin=subprocess.PIPE,
+                                                           stdout=subprocess.PIPE,
+                                                           stderr=subprocess.PIPE)
+            _, stderr = await process.communicate(source.encode())
+            if process.returncode != 0:
+                raise self.assembly_error(instructions, stderr, process.returncode)
+            binary, byteorder = read_elf_section(obj_file, ".text")
+        finally:
+            if os.path.exists(obj_file):
+                os.remove(obj_file)
+
+        return self.split_binary(binary, len(instructions), self.byteorder or byteorder)
+
+    def make_scratch_dir(self):
+        """Points the temporary files at a new private scratch directory, unless they already have a home."""
+        if self.filepath is None:
+            self.scratch_dir = tempfile.mkdtemp(prefix="derive-", dir=scratch_root())
+            self.set_filepath(os.path.join(self.scratch_dir, "test"))
+
+    def assembly_error(self, instructions, stderr, returncode):
+        """Builds the error reported when the assembler rejects a batch.
+
+        GNU as reports every line it rejects as "<file>:<line>: Error: ...",
+        and the source has one instruction per line, so the rejected
+        instructions can be read off stderr. Any other failure, such as the
+        assembler being killed or failing to write its output, is a failure
+        of the toolchain rather than a rejection.
+
+        Args:
+            instructions (list(str)): The instructions that were assembled.
+            stderr (bytes): The error output of the assembler.
+            returncode (int): The exit status of the assembler, negative if it was killed by a signal.
+
+        Returns:
+            RuntimeError: The error to raise, a RejectedError if stderr names the rejected lines.
+        """
+        if len(instructions) == 1:
+            message = f"Error assembling instruction: `{instructions[0]}`\n{stderr.decode(errors='replace')}"
+        else:
+            message = f"Error assembling {len(instructions)} instructions:\n{stderr.decode(errors='replace')}"
+        lines = {int(match.group(1)) for match in re.finditer(rb"^[^\n]*?:(\d+): Error: ", stderr, re.M)}
+        rejected = sorted(line - 1 for line in lines if 1 <= line <= len(instructions))
+        if returncode > 0 and len(rejected) > 0:
+            return RejectedError(message, rejected)
+        return RuntimeError(message)
+
+    def split_binary(self, binary, n_instructions, byteorder):
+        """Splits assembled machine code into big endian instruction encodings.
+
+        Args:
+            binary (bytes): The machine code.
+            n_instructions (int): The number of instructions it should hold.
+            byteorder (str): The byte order of the instructions in binary.
+
+        Raises:
+            RuntimeError: The machine code has the wrong size.
+
+        Returns:
+            list(bytes): The encoding of each instruction.
+        """
+        if (len(binary) != self.n_bytes * n_instructions):
+            raise RuntimeError(f"Expected {n_instructions} {self.n_bytes} byte instructions but got {len(binary)} bytes!")
+
+        n = self.n_bytes
+        if byteorder == "little":
+            # convert each instruction from little endian
+            return [bytes(reversed(binary[i:i + n])) for i in range(0, len(binary), n)]
+        return [binary[i:i + n] for i in range(0, len(binary), n)]
+
+    def clone(self, filepath):
+        """Creates an assembler with the same configuration that keeps its temporary files at filepath."""
+        clone = type(self)({**self.config_dict, "filepath": filepath})
+        clone.cached_identity = self.cached_identity
+        return clone
+
+    def identity(self):
+        """Returns a string identifying the toolchain and the exact command lines used.
+
+        When as_command runs a compiler driver (it has -c), the assembler the
+        driver runs is fingerprinted too, so upgrading binutils alone changes
+        the identity. The driver is only asked which assembler it runs when it
+        has changed (see driver_assembler), so this usually runs no
+        subprocess. The result is computed once per assembler.
+        """
+        if self.cached_identity is None:
+            fingerprints = [tool_fingerprint(self.as_command[0])]
+            if "-c" in self.as_command:
+                program = driver_assembler(self.as_command[0])
+                if program is not None:
+                    fingerprints.append(tool_fingerprint(program))
+            self.cached_identity = " ".join([super().identity()] + fingerprints + self.as_command)
+        return self.cached_identity
+
+    def cleanup(self):
+        """Cleans up any temporary files created during the assembly process."""
+        if self.scratch_dir is not None:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+            self.scratch_dir = None
+            self.set_filepath(None)
+            return
+
+        # nothing is created if the assembler was never used
+        if self.obj_file is not None and os.path.exists(self.obj_file):
+            os.remove(self.obj_file)
+
+class AssemblerPool(Assembler):
+    """Assembles batches on a pool of worker threads.
+
+    The pool keeps at most jobs long-lived workers. Each worker lazily clones
+    the wrapped assembler into its own scratch directory (on tmpfs when
+    available), so workers never share the assembler's temporary files.
+    Several pools can share one executor, so that the assemblers of several
+    configs run on the same workers. cleanup() waits for the workers to
+    finish (unless the executor is shared) and removes their directories.
+    """
+
+    def __init__(self, asm, jobs, executor=None):
+        """Sets up a pool of workers.
+
+        Args:
+            asm (Assembler): The assembler to clone for each worker.
+            jobs (int): The number of workers.
+            executor (ThreadPoolExecutor): Shared workers to run on, or None to start jobs workers
+                owned by this pool.
+        """
+        self.asm = asm
+        self.jobs = jobs
+        self.owns_executor = executor is None
+        self.executor = ThreadPoolExecutor(max_workers=jobs) if executor is None else executor
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # (temporary directory, assembler) of each worker that has started
+        self.workers = []
+
+    def worker_asm(self):
+        """Returns the assembler owned by the calling worker thread, creating it if needed."""
+        asm = getattr(self.local, "asm", None)
+        if asm is None:
+            tmpdir = tempfile.mkdtemp(prefix="derive-", dir=scratch_root())
+            asm = self.asm.clone(os.path.join(tmpdir, "test"))
+            with self.lock:
+                self.workers.append((tmpdir, asm))
+            self.local.asm = asm
+        return asm
+
+    def assemble(self, instruction):
+        """Assembles a given instruction on a worker and returns the resulting binary.
+
+        Args:
+            instruction (str): The instruction to assemble.
+
+        Returns:
+            bytes: The assembled binary.
+        """
+        return self.assemble_many([instruction])[0]
+
+    def assemble_many(self, instructions):
+        """Splits a list of instructions into one contiguous batch per worker and assembles them in parallel.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        if len(instructions) == 0:
+            return []
+
+        n_chunks = max(1, min(self.jobs, len(instructions)))
+        chunk_size = -(-len(instructions) // n_chunks)
+        chunks = [instructions[i:i + chunk_size] for i in range(0, len(instructions), chunk_size)]
+
+        def assemble_chunk(chunk):
+            try:
+                return self.worker_asm().assemble_many(chunk)
+            except RuntimeError as error:
+                return error
+
+        # wait for every chunk, so the rejections of all of them are reported together
+        results = list(self.executor.map(assemble_chunk, chunks))
+        for result in results:
+            if isinstance(result, RuntimeError) and not isinstance(result, RejectedError):
+                raise result
+        binaries = []
+        rejected = []
+        for offset, result in zip(range(0, len(instructions), chunk_size), results):
+            if isinstance(result, RejectedError):
+                if result.rejected is None:
+                    raise RejectedError(f"The assembler rejected some of {len(instructions)} instructions") from result
+                rejected += [offset + i for i in result.rejected]
+            else:
+                binaries += result
+        if len(rejected) > 0:
+            raise RejectedError(f"The assembler rejected {len(rejected)} of {len(instructions)} instructions", rejected)
+        return binaries
+
+    def cleanup(self):
+        """Stops the workers and removes their temporary directories."""
+        if self.owns_executor:
+            self.executor.shutdown()
+        for tmpdir, asm in self.workers:
+            asm.cleanup()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.workers = []
+
+    def identity(self):
+        """Returns a string identifying everything that determines the assembled output."""
+        return self.asm.identity()
+
+    def arch(self):
+        """Returns a string denoting the assembler architecture."""
+        return self.asm.arch()
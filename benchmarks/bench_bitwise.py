@@ -0,0 +1,82 @@
+"""Micro-benchmark of the int-native bitwise helpers against the bytes round-tripping they replaced.
+
+Usage: python3 benchmarks/bench_bitwise.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bitwise
+from instruction import Field
+
+WIDTHS = [32, 64, 128, 256]
+
+# The bytes-based implementations from before the int-native rewrite, kept as the reference.
+
+def legacy_AND(a, b):
+    return bitwise.to_bytes(bitwise.to_int(a) & bitwise.to_int(b), max(len(a), len(b)))
+
+def legacy_NOT(a):
+    ones = bytes([0xFF for i in range(len(a))])
+    return bitwise.to_bytes(bitwise.to_int(a) ^ bitwise.to_int(ones), len(a))
+
+def legacy_FFS(a):
+    max_idx = len(a) * 8
+    a = bitwise.to_int(a)
+    for i in reversed(range(max_idx)):
+        if (a & (1 << i)) != 0:
+            return i
+    return -1
+
+def legacy_generate(field, value, length):
+    result = 0
+    for field_idx, instr_idx in enumerate(field.locs):
+        result |= (bitwise.bit_get(value, field_idx) << instr_idx)
+    return bitwise.to_bytes(result, length)
+
+def time_per_call(stmt, number):
+    """Returns the best time per call of stmt in microseconds."""
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+def bench_width(n_bits, number=20000):
+    """Benchmarks the helpers used by the solver and Field.generate on n_bits wide values.
+
+    Returns:
+        list(tuple(str, float, float)): (name, legacy us/call, int-native us/call) for each case.
+    """
+    length = n_bits // 8
+    all_bits = bitwise.mask(n_bits)
+    # a one-hot value at the bottom is the worst case for the old top-down FFS scan
+    one_hot_int = 1 << 3
+    one_hot = bitwise.to_bytes(one_hot_int, length)
+    word_int = 0x5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A & all_bits
+    word = bitwise.to_bytes(word_int, length)
+
+    # a field spread over every other bit of the instruction
+    field = Field("f")
+    for field_idx in range(n_bits // 2):
+        field.set_instr_idx(field_idx, 2 * field_idx)
+    value = bitwise.mask(n_bits // 2)
+
+    return [
+        ("and_not",
+         time_per_call(lambda: legacy_AND(word, legacy_NOT(one_hot)), number),
+         time_per_call(lambda: word_int & bitwise.NOT(one_hot_int, n_bits), number)),
+        ("ffs",
+         time_per_call(lambda: legacy_FFS(one_hot), number),
+         time_per_call(lambda: bitwise.FFS(one_hot_int), number)),
+        ("field_generate",
+         time_per_call(lambda: legacy_generate(field, value, length), number // 10),
+         time_per_call(lambda: field.generate(value), number // 10)),
+    ]
+
+def main():
+    print(f"{'case':<16}{'bits':>6}{'legacy us':>12}{'int us':>10}{'speedup':>10}")
+    for n_bits in WIDTHS:
+        for name, legacy, native in bench_width(n_bits):
+            print(f"{name:<16}{n_bits:>6}{legacy:>12.3f}{native:>10.3f}{legacy / native:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
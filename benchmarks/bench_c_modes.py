@@ -0,0 +1,118 @@
+"""Benchmark of the "inline" and "table" header output modes: code size and encode latency, compiled with gcc.
+
+The "direct" row uses the table mode header but calls <arch>_encode(instr, args)
+directly, as a JIT holding its operands in an array would.
+
+Usage: python3 benchmarks/bench_c_modes.py [n_instructions]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from assembler import read_elf_section
+from derive import header_text
+from instruction import Instruction
+from samples import sample_instructions
+
+# one call site per instruction, the way a JIT calls the encoders, plus a timing loop over all of them
+DRIVER = """#include <stdint.h>
+#include <stdio.h>
+#include <time.h>
+#include "insts.h"
+
+{call_sites}
+
+static uint32_t (*const calls[])(const uint32_t *) = {{{call_names}}};
+
+int main(void) {{
+    uint32_t args[8] = {{1, 2, 3, 4, 5, 6, 7, 8}};
+    volatile uint32_t sink = 0;
+    struct timespec start, end;
+    long n_rounds = {n_rounds};
+
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    for (long round = 0; round < n_rounds; round++) {{
+        for (unsigned i = 0; i < sizeof(calls) / sizeof(calls[0]); i++) {{
+            sink ^= calls[i](args);
+            args[i % 8] += 0x9e3779b9u;
+        }}
+    }}
+    clock_gettime(CLOCK_MONOTONIC, &end);
+
+    double ns = (end.tv_sec - start.tv_sec) * 1e9 + (end.tv_nsec - start.tv_nsec);
+    printf("%.2f\\n", ns / (n_rounds * (double)(sizeof(calls) / sizeof(calls[0]))));
+    return 0;
+}}
+"""
+
+def scaled_instructions(n_instructions):
+    """Returns n_instructions 32 bit ARM instructions, cycling through the ARM samples under new names."""
+    samples = [instr for instr in sample_instructions() if instr.arch == "arm"]
+    instructions = []
+    for i in range(n_instructions):
+        sample = samples[i % len(samples)]
+        instr = Instruction.from_dict({**sample.to_dict(), "name": f"{sample.name}_{i}", "opcode": f"{sample.opcode ^ ((i << 20) & 0xf00000):x}"})
+        instructions.append(instr)
+    return instructions
+
+def driver_source(instructions, n_rounds, direct=False):
+    """Generates the C driver calling every instruction's encoder.
+
+    With direct, the call sites pass their argument array straight to the
+    generic <arch>_encode routine of the table mode instead of calling the wrappers.
+    """
+    call_sites = []
+    for instr in instructions:
+        if direct:
+            call = f"{instr.arch}_encode({instr.arch.upper()}_{instr.name.upper()}, a)"
+        else:
+            call = f"{instr.arch}_{instr.name}({', '.join(f'a[{i}]' for i in range(len(instr.fields)))})"
+        call_sites.append(f"__attribute__((noinline)) static uint32_t call_{instr.name}(const uint32_t *a) {{ (void)a; return {call}; }}")
+    call_names = ", ".join(f"call_{instr.name}" for instr in instructions)
+    return DRIVER.format(call_sites="\n".join(call_sites), call_names=call_names, n_rounds=n_rounds)
+
+def bench_mode(instructions, output_mode, workdir, direct=False, n_rounds=200000):
+    """Compiles the driver against a header in the given output mode.
+
+    Returns:
+        tuple(int, int, int, float): Header size, .text and .rodata sizes of the driver
+            in bytes, and nanoseconds per encode.
+    """
+    header = header_text({instr.name: instr for instr in instructions}, output_mode=output_mode)
+    with open(os.path.join(workdir, "insts.h"), "w") as f:
+        f.write(header)
+    with open(os.path.join(workdir, "driver.c"), "w") as f:
+        f.write(driver_source(instructions, n_rounds, direct))
+
+    obj = os.path.join(workdir, "driver.o")
+    exe = os.path.join(workdir, "driver")
+    subprocess.run(["gcc", "-O2", "-c", "-o", obj, os.path.join(workdir, "driver.c")], check=True)
+    subprocess.run(["gcc", "-o", exe, obj], check=True)
+    text, _ = read_elf_section(obj, ".text")
+    try:
+        rodata, _ = read_elf_section(obj, ".rodata")
+    except RuntimeError:
+        rodata = b""
+    ns = float(subprocess.run([exe], check=True, capture_output=True, text=True).stdout)
+    return len(header), len(text), len(rodata), ns
+
+if __name__ == "__main__":
+    if shutil.which("gcc") is None:
+        print("gcc not found, skipping")
+        sys.exit(0)
+
+    n_instructions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    instructions = scaled_instructions(n_instructions)
+    workdir = tempfile.mkdtemp(prefix="derive-bench-")
+    try:
+        print(f"{n_instructions} instructions, gcc -O2")
+        print(f"{'mode':<8} {'header bytes':>12} {'.text bytes':>12} {'.rodata bytes':>14} {'ns/encode':>10}")
+        for label, output_mode, direct in [("inline", "inline", False), ("table", "table", False), ("direct", "table", True)]:
+            header_size, text_size, rodata_size, ns = bench_mode(instructions, output_mode, workdir, direct)
+            print(f"{label:<8} {header_size:>12} {text_size:>12} {rodata_size:>14} {ns:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,82 @@
+"""Benchmark of CodeBuffer against encoding with Instruction.assemble() and joining the bytes.
+
+Emits a program of the 32 bit ARM sample instructions with a backward
+branch every 16 instructions.
+
+Usage: python3 benchmarks/bench_codebuffer.py [n_instructions]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from codebuffer import CodeBuffer
+from instruction import Instruction, Field
+from samples import sample_instructions, sample_args
+
+def branch_instruction():
+    """Returns an ARM b with its signed 24 bit word offset in the low bits."""
+    instr = Instruction("arm", "b")
+    instr.set_opcode(0xea000000, 32)
+    offset = Field("offset", True)
+    for i in range(24):
+        offset.set_instr_idx(i, i)
+    instr.add_fields(offset)
+    return instr
+
+def program(n_instructions):
+    """Returns the (instruction, args) rows of the program, with None rows standing for the branches."""
+    instructions = [instr for instr in sample_instructions() if instr.arch == "arm"]
+    rows = []
+    for i in range(n_instructions):
+        if i % 16 == 15:
+            rows.append(None)
+        else:
+            instr = instructions[i % len(instructions)]
+            rows.append((instr, sample_args(instr, i)))
+    return rows
+
+def emit_assemble(rows, branch):
+    """Encodes each row with assemble(), computing branch offsets by hand, and joins the bytes."""
+    chunks = []
+    loop = 0
+    for i, row in enumerate(rows):
+        if row is None:
+            chunks.append((branch.assemble({"offset": (loop - (i * 4 + 8)) >> 2}) & 0xFFFFFFFF).to_bytes(4, "little"))
+            loop = (i + 1) * 4
+        else:
+            chunks.append(row[0].assemble(row[1]).to_bytes(4, "little"))
+    return b"".join(chunks)
+
+def emit_codebuffer(rows, branch, instructions):
+    """Emits the rows, given as (instr_name, positional args), into a CodeBuffer with labels for the branch targets."""
+    buffer = CodeBuffer(instructions + [branch])
+    emitters = {instr.name: buffer.emitter(instr.name) for instr in instructions}
+    loop = buffer.bind(buffer.label())
+    for row in rows:
+        if row is None:
+            buffer.emit_branch("b", "offset", loop, shift=2, pc_offset=8)
+            loop = buffer.bind(buffer.label())
+        else:
+            emitters[row[0]](*row[1])
+    return buffer.finalize()
+
+if __name__ == "__main__":
+    n_instructions = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    rows = program(n_instructions)
+    branch = branch_instruction()
+    instructions = sample_instructions()
+    positional = [None if row is None else (row[0].name, tuple(row[1].values())) for row in rows]
+
+    results = {}
+    for label, emit in [("assemble + join", lambda: emit_assemble(rows, branch)),
+                        ("emitter()", lambda: emit_codebuffer(positional, branch, instructions))]:
+        start = time.perf_counter()
+        code = emit()
+        results[label] = (time.perf_counter() - start, bytes(code))
+
+    assert results["assemble + join"][1] == results["emitter()"][1]
+    print(f"{n_instructions} instructions ({len(results['emitter()'][1]) / 1e6:.1f} MB)")
+    for label, (seconds, _) in results.items():
+        print(f"{label:<16} {seconds:8.3f}s {n_instructions / seconds:>14,.0f} instructions/s")
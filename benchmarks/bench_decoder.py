@@ -0,0 +1,62 @@
+"""Benchmark of the Decoder on a multi-megabyte image built from the sample instructions.
+
+Usage: python3 benchmarks/bench_decoder.py [megabytes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from decoder import Decoder
+from samples import sample_instructions, sample_args
+
+def build_image(instructions, n_words):
+    """Encodes n_words instructions (cycling through instructions) into a little endian image."""
+    image = bytearray(n_words * 4)
+    n_rows = -(-n_words // len(instructions))
+    for i, instr in enumerate(instructions):
+        rows = [sample_args(instr, row) for row in range(n_rows)]
+        words = [instr.assemble(args) & 0xFFFFFFFF for args in rows]
+        for row, word in enumerate(words):
+            idx = row * len(instructions) + i
+            if idx < n_words:
+                image[4 * idx:4 * idx + 4] = word.to_bytes(4, "little")
+    return image
+
+def bench_decoder(megabytes=4):
+    """Measures Decoder.decode on single words and Decoder.decode_file on an mmapped image.
+
+    Returns:
+        dict(str, float): Words per second of decode() and MB per second of decode_file().
+    """
+    arm = [instr for instr in sample_instructions() if instr.arch == "arm"]
+    decoder = Decoder(arm)
+    n_words = megabytes * (1 << 20) // 4
+    image = build_image(arm, n_words)
+    words = [int.from_bytes(image[i:i + 4], "little") for i in range(0, min(len(image), 400000), 4)]
+
+    start = time.perf_counter()
+    for word in words:
+        decoder.decode(word)
+    decode_rate = len(words) / (time.perf_counter() - start)
+
+    with tempfile.NamedTemporaryFile(suffix=".bin") as f:
+        f.write(image)
+        f.flush()
+        start = time.perf_counter()
+        n_decoded = sum(1 for _ in decoder.decode_file(f.name))
+        elapsed = time.perf_counter() - start
+    assert n_decoded == n_words
+
+    return {"decode_words_per_s": decode_rate, "stream_mb_per_s": megabytes / elapsed, "stream_s": elapsed}
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    result = bench_decoder(megabytes)
+    print(f"decode():      {result['decode_words_per_s']:,.0f} words/s")
+    print(f"decode_file(): {megabytes} MB in {result['stream_s']:.3f} s ({result['stream_mb_per_s']:.1f} MB/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark of Instruction.compile() encoders and Instruction.assemble_batch() against Instruction.assemble().
+
+Usage: python3 benchmarks/bench_encoder.py
+"""
+import array
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import instruction
+from samples import sample_instructions, sample_args
+
+def encodes_per_second(encode, rows):
+    """Returns the number of rows encode() processes per second (best of 5)."""
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        encode(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+def bench_instruction(instr, n_rows=20000):
+    """Measures assemble(), the compiled encoder with positional arguments and with keyword arguments.
+
+    Returns:
+        dict(str, float): Encodings per second of each method.
+    """
+    rows = [sample_args(instr, i) for i in range(n_rows)]
+    positional = [tuple(args.values()) for args in rows]
+    encoder = instr.compile()
+    for args in rows[:100]:
+        assert encoder(*args.values()) == instr.assemble(args)
+
+    return {
+        "assemble": encodes_per_second(lambda rows: [instr.assemble(args) for args in rows], rows),
+        "compiled": encodes_per_second(lambda rows: [encoder(*args) for args in rows], positional),
+        "compiled_kwargs": encodes_per_second(lambda rows: [encoder(**args) for args in rows], rows),
+    }
+
+def bench_batch(instr, n_rows=200000):
+    """Measures assemble_batch() into a preallocated buffer, with and without NumPy.
+
+    Returns:
+        dict(str, float): Encodings per second of each available path.
+    """
+    rows = [sample_args(instr, i) for i in range(n_rows)]
+    columns = {field.name: array.array("i", [args[field.name] for args in rows]) for field in instr.fields}
+    out = bytearray(n_rows * instr.n_bits // 8)
+
+    result = {}
+    numpy = instruction.numpy
+    try:
+        instruction.numpy = None
+        result["batch_python"] = encodes_per_second(lambda rows: instr.assemble_batch(columns, out, count=n_rows), rows)
+    finally:
+        instruction.numpy = numpy
+    if numpy is not None:
+        result["batch_numpy"] = encodes_per_second(lambda rows: instr.assemble_batch(columns, out, count=n_rows), rows)
+    return result
+
+def main():
+    print(f"{'instruction':<20}{'assemble/s':>14}{'compiled/s':>14}{'kwargs/s':>14}{'batch/s':>14}{'numpy/s':>14}")
+    for instr in sample_instructions():
+        result = bench_instruction(instr)
+        result.update(bench_batch(instr))
+        numpy_rate = f"{result['batch_numpy']:>14,.0f}" if "batch_numpy" in result else f"{'n/a':>14}"
+        print(f"{instr.arch + '_' + instr.name:<20}{result['assemble']:>14,.0f}{result['compiled']:>14,.0f}"
+              f"{result['compiled_kwargs']:>14,.0f}{result['batch_python']:>14,.0f}{numpy_rate}")
+
+if __name__ == "__main__":
+    main()
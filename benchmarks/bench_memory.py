@@ -0,0 +1,114 @@
+"""Benchmark of the memory held by solved instructions, and of exchanging them between processes.
+
+Builds many instructions (the sample instructions under distinct names)
+with the slotted, array-backed Field and Instruction, and with dict-based
+copies of the classes as they were before, then times pickling them
+against instrdb.pack_instructions.
+
+Usage: python3 benchmarks/bench_memory.py [n_instructions]
+"""
+import gc
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from instrdb import pack_instructions, unpack_instructions
+from instruction import Instruction, Field
+from samples import SPECS
+
+# The dict-based classes from before the slotted rewrite, kept as the reference.
+
+class LegacyField:
+    def __init__(self, name, signed=False):
+        self.name = name
+        self.signed = signed
+        self.locs = {}
+        self.table = None
+        self.cached_runs = None
+        self.cached_values = None
+
+    def set_instr_idx(self, field_idx, instr_idx):
+        self.locs[field_idx] = instr_idx
+        self.cached_runs = None
+
+class LegacyInstruction:
+    def __init__(self, arch, name):
+        self.arch = arch
+        self.name = name
+        self.opcode = None
+        self.n_bits = None
+        self.fields = []
+
+    def add_fields(self, *fields):
+        self.fields += fields
+
+    def set_opcode(self, opcode, n_bits):
+        self.opcode = opcode
+        self.n_bits = n_bits
+
+def build(instruction_class, field_class, n_instructions):
+    """Builds n_instructions instructions, cycling through SPECS."""
+    instructions = []
+    for i in range(n_instructions):
+        arch, name, n_bits, opcode, fields = SPECS[i % len(SPECS)]
+        instr = instruction_class(arch, f"{name}_{i}")
+        instr.set_opcode(opcode, n_bits)
+        for field_name, instr_idxs in fields:
+            field = field_class(field_name)
+            for field_idx, instr_idx in enumerate(instr_idxs):
+                field.set_instr_idx(field_idx, instr_idx)
+            instr.add_fields(field)
+        instructions.append(instr)
+    return instructions
+
+def measure_build(instruction_class, field_class, n_instructions):
+    """Returns (bytes held, seconds) to build n_instructions instructions.
+
+    The memory is traced in a separate build, since tracing slows allocation down.
+    """
+    gc.collect()
+    tracemalloc.start()
+    instructions = build(instruction_class, field_class, n_instructions)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instructions
+    gc.collect()
+    start = time.perf_counter()
+    build(instruction_class, field_class, n_instructions)
+    return size, time.perf_counter() - start
+
+def measure_exchange(dumps, loads, instructions):
+    """Returns (serialized bytes, seconds to serialize, seconds to deserialize)."""
+    start = time.perf_counter()
+    data = dumps(instructions)
+    dumped = time.perf_counter() - start
+    start = time.perf_counter()
+    loads(data)
+    loaded = time.perf_counter() - start
+    return len(data), dumped, loaded
+
+if __name__ == "__main__":
+    n_instructions = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print(f"{n_instructions} instructions")
+    print(f"{'representation':<24}{'MB':>8}{'bytes/instr':>13}{'build s':>10}")
+    for label, instruction_class, field_class in [("dict-based", LegacyInstruction, LegacyField),
+                                                  ("slotted + array", Instruction, Field)]:
+        size, elapsed = measure_build(instruction_class, field_class, n_instructions)
+        print(f"{label:<24}{size / 1e6:>8.1f}{size / n_instructions:>13.0f}{elapsed:>10.3f}")
+
+    instructions = build(Instruction, Field, n_instructions)
+    # check that both exchange formats round trip before timing them
+    for loads, dumps in [(pickle.loads, pickle.dumps), (unpack_instructions, pack_instructions)]:
+        assert [instr.to_dict() for instr in loads(dumps(instructions[:len(SPECS)]))] == [instr.to_dict() for instr in instructions[:len(SPECS)]]
+
+    print()
+    print(f"{'exchange':<24}{'MB':>8}{'dump s':>10}{'load s':>10}")
+    for label, dumps, loads in [("pickle", lambda instrs: pickle.dumps(instrs, pickle.HIGHEST_PROTOCOL), pickle.loads),
+                                ("pack_instructions", pack_instructions, unpack_instructions)]:
+        size, dumped, loaded = measure_exchange(dumps, loads, instructions)
+        print(f"{label:<24}{size / 1e6:>8.1f}{dumped:>10.3f}{loaded:>10.3f}")
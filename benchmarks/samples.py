@@ -0,0 +1,66 @@
+"""Solved instructions used as fixtures by the benchmarks, so they run without a toolchain."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from instruction import Instruction, Field
+from streamasm import TemplateAssembler
+
+# (arch, name, n_bits, opcode, [(field_name, [instr_idx of each field bit])]), copied from solved headers
+SPECS = [
+    ("arm", "add", 32, 0xe0800000, [("dst", list(range(12, 16))), ("src1", list(range(16, 20))), ("src2", list(range(0, 4)))]),
+    ("arm", "add_imm", 32, 0xe2800000, [("dst", list(range(12, 16))), ("src", list(range(16, 20))), ("imm", list(range(0, 8)))]),
+    ("arm", "add_lsl", 32, 0xe0800000, [("dst", list(range(12, 16))), ("src1", list(range(16, 20))), ("src2", list(range(0, 4))), ("shift", list(range(7, 12)))]),
+    ("arm", "ldr_imm_off", 32, 0xe5900000, [("dst", list(range(12, 16))), ("addr", list(range(16, 20))), ("imm", list(range(0, 8)))]),
+    ("arm", "bx", 32, 0xe12fff10, [("reg", list(range(0, 4)))]),
+    ("arm", "nop", 32, 0xe320f000, []),
+    ("riscv", "addi", 32, 0x13, [("dst", list(range(7, 12))), ("src", list(range(15, 20))), ("imm", list(range(20, 32)))]),
+    ("riscv", "sw", 32, 0x2023, [("src", list(range(20, 25))), ("offset", list(range(7, 12)) + list(range(25, 32))), ("addr", list(range(15, 20)))]),
+]
+
+# regex and template of each of SPECS, in the syntax of the example configs
+REGEX = r"@([a-zA-Z0-9]+):(-?[0-9]+)"
+TEMPLATES = {
+    "add": "add r@dst:4, r@src1:4, r@src2:4",
+    "add_imm": "add r@dst:4, r@src:4, #@imm:8",
+    "add_lsl": "add r@dst:4, r@src1:4, r@src2:4, LSL #@shift:5",
+    "ldr_imm_off": "ldr r@dst:4, [r@addr:4, #@imm:8]",
+    "bx": "bx r@reg:4",
+    "nop": "nop",
+    "addi": "addi x@dst:5, x@src:5, @imm:12",
+    "sw": "sw x@src:5, @offset:12(x@addr:5)",
+}
+
+def make_instruction(arch, name, n_bits, opcode, fields):
+    """Builds a solved Instruction from one of SPECS."""
+    instr = Instruction(arch, name)
+    instr.set_opcode(opcode, n_bits)
+    for field_name, instr_idxs in fields:
+        field = Field(field_name)
+        for field_idx, instr_idx in enumerate(instr_idxs):
+            field.set_instr_idx(field_idx, instr_idx)
+        instr.add_fields(field)
+    return instr
+
+def sample_instructions():
+    """Returns a list of solved instructions covering contiguous, scattered and signed fields."""
+    return [make_instruction(*spec) for spec in SPECS]
+
+def sample_args(instr, i):
+    """Returns deterministic in-range arguments for the ith encoding of instr."""
+    return {field.name: (i * 2654435761 + j * 40503) % (1 << (len(field.locs) - 1)) for j, field in enumerate(instr.fields)}
+
+def sample_templates(arch):
+    """Returns the (instr_name, template) of every sample instruction of an architecture."""
+    return [(name, TEMPLATES[name]) for spec_arch, name, *_ in SPECS if spec_arch == arch]
+
+def fake_assembler(arch):
+    """Returns a deterministic in-process Assembler for the sample templates of an architecture.
+
+    It encodes probes with the sample instructions themselves, so solving
+    the sample templates against it costs no toolchain time and recovers
+    exactly the sample instructions.
+    """
+    instructions = {instr.name: instr for instr in sample_instructions() if instr.arch == arch}
+    return TemplateAssembler(sample_templates(arch), REGEX, instructions)
@@ -0,0 +1,246 @@
+"""Benchmark suite of the solver, encoder and emitter hot paths, with JSON baselines.
+
+Runs offline: solving uses the in-process fake assembler from samples.py.
+
+Usage:
+    python3 benchmarks/suite.py run [-o results.json] [-k substring] [--repeat N]
+    python3 benchmarks/suite.py compare baseline.json results.json [--threshold 0.1]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bitwise
+import derive
+from codebuffer import CodeBuffer
+from decoder import Decoder
+from instrdb import pack_instructions, unpack_instructions
+from instruction import to_c_table
+from samples import REGEX, sample_instructions, sample_args, sample_templates, fake_assembler
+
+# bump whenever the meaning of the results changes, so old baselines are not compared against
+SUITE_VERSION = 1
+
+def ops_per_second(fn, n_ops, repeat):
+    """Returns n_ops divided by the fastest of repeat calls to fn()."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return n_ops / best
+
+def bench_solve(arch):
+    """Solving every sample template of arch against the fake assembler."""
+    asm = fake_assembler(arch)
+    templates = sample_templates(arch)
+
+    def solve():
+        with contextlib.redirect_stdout(io.StringIO()):
+            derive.solve_instructions(asm, templates, REGEX)
+    return solve, len(templates)
+
+def bench_assemble():
+    """Instruction.assemble over the sample instructions."""
+    rows = [(instr, sample_args(instr, i)) for instr in sample_instructions() for i in range(500)]
+    return lambda: [instr.assemble(args) for instr, args in rows], len(rows)
+
+def bench_compiled():
+    """The compiled encoders of the sample instructions."""
+    rows = []
+    for instr in sample_instructions():
+        encoder = instr.compile()
+        rows += [(encoder, tuple(sample_args(instr, i).values())) for i in range(500)]
+    return lambda: [encoder(*args) for encoder, args in rows], len(rows)
+
+def bench_generate():
+    """Field.generate over every field of the sample instructions."""
+    rows = [(field, args[field.name]) for instr in sample_instructions() for i in range(500)
+            for args in [sample_args(instr, i)] for field in instr.fields]
+    return lambda: [field.generate(value) for field, value in rows], len(rows)
+
+def bench_bitwise():
+    """A mix of the bitwise helpers on 32 bit values."""
+    values = [(i * 2654435761) & 0xFFFFFFFF for i in range(1, 1001)]
+    as_bytes = [bitwise.to_bytes(value, 4) for value in values]
+
+    def run():
+        for value, data in zip(values, as_bytes):
+            bitwise.to_int(data)
+            bitwise.to_bytes(value, 4)
+            bitwise.FFS(value)
+            bitwise.FLS(value)
+            bitwise.bit_count(value)
+            bitwise.NOT(value, 32)
+            bitwise.AND(data, data)
+            for _ in bitwise.set_bits(value):
+                pass
+    return run, len(values)
+
+def bench_to_c_function():
+    """Emitting the inline C function of each sample instruction."""
+    instructions = sample_instructions()
+    return lambda: [instr.to_c_function() for instr in instructions], len(instructions)
+
+def bench_to_c_table():
+    """Emitting the table-mode C encoder of the 32 bit ARM sample instructions."""
+    instructions = [instr for instr in sample_instructions() if instr.arch == "arm"]
+    return lambda: to_c_table(instructions), len(instructions)
+
+def bench_decode():
+    """Decoder.decode over encodings of the ARM sample instructions."""
+    instructions = [instr for instr in sample_instructions() if instr.arch == "arm"]
+    decoder = Decoder(instructions)
+    words = [instr.assemble(sample_args(instr, i)) for instr in instructions for i in range(500)]
+    return lambda: [decoder.decode(word) for word in words], len(words)
+
+def bench_streamasm():
+    """TemplateAssembler.assemble_stream over lines of the ARM sample templates."""
+    asm = fake_assembler("arm")
+    lines = []
+    for instr_name, template in sample_templates("arm"):
+        matches = list(re.finditer(REGEX, template))
+        for i in range(200):
+            lines.append(derive.fill_template(template, matches, [i % (1 << int(match.group(2))) for match in matches]))
+    return lambda: asm.assemble_stream(lines, bytearray()), len(lines)
+
+def bench_codebuffer():
+    """CodeBuffer emitters appending the ARM sample instructions."""
+    instructions = [instr for instr in sample_instructions() if instr.arch == "arm"]
+    rows = [(instr.name, tuple(sample_args(instr, i).values())) for instr in instructions for i in range(500)]
+
+    def run():
+        buffer = CodeBuffer(instructions)
+        emitters = {instr.name: buffer.emitter(instr.name) for instr in instructions}
+        for instr_name, args in rows:
+            emitters[instr_name](*args)
+        buffer.finalize()
+    return run, len(rows)
+
+def bench_exchange():
+    """instrdb.pack_instructions and unpack_instructions round trips of the sample instructions."""
+    instructions = sample_instructions() * 500
+    return lambda: unpack_instructions(pack_instructions(instructions)), len(instructions)
+
+# {name: (setup, unit)}, where setup() returns (fn, number of operations per call of fn)
+BENCHMARKS = {
+    "solve.arm": (lambda: bench_solve("arm"), "templates/s"),
+    "solve.riscv": (lambda: bench_solve("riscv"), "templates/s"),
+    "instruction.assemble": (bench_assemble, "encodes/s"),
+    "instruction.compiled": (bench_compiled, "encodes/s"),
+    "field.generate": (bench_generate, "fields/s"),
+    "bitwise.mix": (bench_bitwise, "values/s"),
+    "emit.to_c_function": (bench_to_c_function, "functions/s"),
+    "emit.to_c_table": (bench_to_c_table, "instructions/s"),
+    "decoder.decode": (bench_decode, "words/s"),
+    "streamasm.assemble_stream": (bench_streamasm, "lines/s"),
+    "codebuffer.emitter": (bench_codebuffer, "instructions/s"),
+    "instrdb.exchange": (bench_exchange, "instructions/s"),
+}
+
+def run(names, repeat):
+    """Runs benchmarks.
+
+    Args:
+        names (list(str)): The benchmarks to run.
+        repeat (int): How many times to time each one (the fastest run counts).
+
+    Returns:
+        dict: The results, ready to be written as JSON.
+    """
+    results = {}
+    for name in names:
+        setup, unit = BENCHMARKS[name]
+        fn, n_ops = setup()
+        fn()  # warm up
+        results[name] = {"ops_per_second": ops_per_second(fn, n_ops, repeat), "unit": unit}
+        print(f"{name:<28} {results[name]['ops_per_second']:>16,.0f} {unit}")
+    return {"version": SUITE_VERSION,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "results": results}
+
+def compare(baseline, current, threshold):
+    """Compares two sets of results.
+
+    Args:
+        baseline (dict): The output of run() to compare against.
+        current (dict): The output of run() to check.
+        threshold (float): The relative slowdown (e.g. 0.1 for 10%) beyond which a benchmark regressed.
+
+    Raises:
+        RuntimeError: The results come from different versions of the suite.
+
+    Returns:
+        list(str): The names of the benchmarks that regressed.
+    """
+    if baseline.get("version") != SUITE_VERSION or current.get("version") != SUITE_VERSION:
+        raise RuntimeError(f"Can only compare results of suite version {SUITE_VERSION}")
+
+    regressions = []
+    print(f"{'benchmark':<28} {'baseline':>16} {'current':>16} {'change':>8}")
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:<28} {'-':>16} {result['ops_per_second']:>16,.0f}")
+            continue
+        before = baseline["results"][name]["ops_per_second"]
+        after = result["ops_per_second"]
+        change = after / before - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28} {before:>16,.0f} {after:>16,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the solver, encoder and emitter hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("-o", "--output", default=None, help="Write the results as JSON to this file, e.g. a baseline.")
+    run_parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this string.")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Time each benchmark this many times and keep the fastest.")
+    run_parser.add_argument("--compare", metavar="BASELINE", default=None, help="Compare the results against a baseline.")
+    run_parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown that counts as a regression (default 0.1).")
+
+    compare_parser = commands.add_parser("compare", help="Compare results against a baseline.")
+    compare_parser.add_argument("baseline", help="The baseline results.")
+    compare_parser.add_argument("current", help="The results to check.")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown that counts as a regression (default 0.1).")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        current = run([name for name in BENCHMARKS if args.filter in name], args.repeat)
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=1)
+        if args.compare is None:
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    if len(regressions) > 0:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
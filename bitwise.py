@@ -22,21 +22,34 @@ def to_bytes(i, length):
     return i.to_bytes(length, byteorder="big", signed=False)
 
 def to_hex(a):
-    """Converts a byte array to a hex string.
+    """Converts a byte array or int to a hex string.
 
     Args:
-        a (bytes)
+        a (bytes | int)
 
     Returns:
         str: a
     """
-    return format(to_int(a), 'x')
+    if type(a) is bytes:
+        a = to_int(a)
+    return format(a, 'x')
+
+def mask(width):
+    """Returns an int with the low width bits set.
+
+    Args:
+        width (int)
+
+    Returns:
+        int: (1 << width) - 1
+    """
+    return (1 << width) - 1
 
 def AND(a, b):
     """Performs bitwise and on two given byte arrays.
 
     Args:
-        a (bytes) 
+        a (bytes)
         b (bytes)
 
     Returns:
@@ -49,7 +62,7 @@ def OR(a, b):
     """Performs bitwise or on two given byte arrays.
 
     Args:
-        a (bytes) 
+        a (bytes)
         b (bytes)
 
     Returns:
@@ -62,7 +75,7 @@ def XOR(a, b):
     """Performs bitwise xor on two given byte arrays.
 
     Args:
-        a (bytes) 
+        a (bytes)
         b (bytes)
 
     Returns:
@@ -71,33 +84,70 @@ def XOR(a, b):
     result = to_int(a) ^ to_int(b)
     return to_bytes(result, max(len(a), len(b)))
 
-def NOT(a):
-    """Performs bitwise not on a given byte array.
+def NOT(a, width=None):
+    """Performs bitwise not on a given byte array, or on an int of the given width.
 
     Args:
-        a (bytes)
+        a (bytes | int)
+        width (int): The width of a in bits (only used if a is an int)
 
     Returns:
-        bytes: ~a
+        bytes | int: ~a
     """
-    ones = bytes([0xFF for i in range(len(a))])
-    return XOR(a, ones) # a ^ 1 = ~a
+    if type(a) is int:
+        return ~a & mask(width)
+    return to_bytes(~to_int(a) & mask(len(a) * 8), len(a))
 
 def FFS(a):
     """Finds index of least significant set bit.
 
     Args:
-        a (bytes): _description_
+        a (bytes | int)
+
+    Returns:
+        int: the index (0 for LSB, 1 for 2nd LSB, etc.) or -1 if no bits are set
+    """
+    if type(a) is bytes:
+        a = to_int(a)
+    return (a & -a).bit_length() - 1
+
+def FLS(a):
+    """Finds index of most significant set bit.
+
+    Args:
+        a (bytes | int)
 
     Returns:
         int: the index (0 for LSB, 1 for 2nd LSB, etc.) or -1 if no bits are set
     """
-    max_idx = len(a) * 8
-    a = to_int(a) # use int value for and
-    for i in reversed(range(max_idx)):
-        if (a & (1 << i)) != 0:
-            return i
-    return -1
+    if type(a) is bytes:
+        a = to_int(a)
+    return a.bit_length() - 1
+
+def set_bits(a):
+    """Iterates over the indices of the set bits of a non-negative int, from least significant.
+
+    Args:
+        a (int)
+
+    Yields:
+        int: the index of each set bit
+    """
+    while a:
+        low = a & -a
+        yield low.bit_length() - 1
+        a ^= low
+
+def bit_count(a):
+    """Counts the set bits of a non-negative integer.
+
+    Args:
+        a (int)
+
+    Returns:
+        int: the number of set bits in a
+    """
+    return bin(a).count("1")
 
 def bit_get(a, i):
     """Gets the ith bit of a byte array or int
@@ -121,8 +171,8 @@ def bit_set(a, i):
         i (int)
 
     Returns:
-        bytes: a | (1 << i)
+        bytes | int: a | (1 << i), of the same type as a
     """
     if type(a) is int:
-        a = to_bytes(a)
-    return OR(a, to_bytes(1 << i, len(a)))
\ No newline at end of file
+        return a | (1 << i)
+    return OR(a, to_bytes(1 << i, len(a)))
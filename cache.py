@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from assembler import Assembler, RejectedError, driver_programs
+
+# cached in place of the binary of a source that the assembler rejected
+REJECTED = b""
+
+def default_cache_dir():
+    """Returns the default directory for the probe cache ($XDG_CACHE_HOME/derive-py)."""
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "derive-py")
+
+class ProbeCache:
+    """Persistent content-addressed cache of assembled binaries.
+
+    Binaries are keyed by a hash of the assembler identity and the source
+    text, and stored in a single sqlite database. Sources that the assembler
+    rejected are stored under the same key with the empty binary REJECTED.
+    Once the cache holds more than max_entries binaries, the least recently
+    used ones are evicted. The cache also keeps assembler.driver_programs,
+    so that identifying a toolchain driven by gcc runs no subprocess.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=500000):
+        """Opens (or creates) a probe cache.
+
+        Args:
+            cache_dir (str): Directory holding the cache database (defaults to default_cache_dir()).
+            max_entries (int): The number of binaries to keep when pruning.
+        """
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.path = os.path.join(cache_dir, "probes.sqlite3")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS probes (key TEXT PRIMARY KEY, binary BLOB NOT NULL, used INTEGER NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS probes_used ON probes (used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS drivers (fingerprint TEXT PRIMARY KEY, program TEXT NOT NULL)")
+        self.db.commit()
+        for fingerprint, program in self.db.execute("SELECT fingerprint, program FROM drivers"):
+            driver_programs.setdefault(fingerprint, program)
+
+    @staticmethod
+    def key(identity, source):
+        """Computes the cache key of a source string.
+
+        Args:
+            identity (str): The Assembler.identity() of the assembler.
+            source (str): The source text that is assembled.
+
+        Returns:
+            str: The cache key.
+        """
+        return hashlib.sha256(f"{identity}\0{source}".encode()).hexdigest()
+
+    def get_many(self, keys):
+        """Looks up a list of keys, marking the ones found as recently used.
+
+        Args:
+            keys (list(str)): The keys to look up.
+
+        Returns:
+            list(bytes | None): The cached binary of each key, or None on a miss.
+        """
+        found = {}
+        with self.lock:
+            # stay well below sqlite's limit on the number of query parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                query = f"SELECT key, binary FROM probes WHERE key IN ({', '.join('?' * len(chunk))})"
+                found.update(self.db.execute(query, chunk).fetchall())
+
+            now = time.time_ns()
+            self.db.executemany("UPDATE probes SET used = ? WHERE key = ?", [(now, key) for key in found])
+            self.db.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, items):
+        """Stores binaries in the cache.
+
+        Args:
+            items (list(tuple(str, bytes))): (key, binary) pairs to store.
+        """
+        now = time.time_ns()
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO probes (key, binary, used) VALUES (?, ?, ?)",
+                                [(key, binary, now) for key, binary in items])
+            self.db.commit()
+
+    def prune(self):
+        """Evicts the least recently used binaries until at most max_entries remain."""
+        with self.lock:
+            n_entries, = self.db.execute("SELECT COUNT(*) FROM probes").fetchone()
+            if n_entries > self.max_entries:
+                self.db.execute("DELETE FROM probes WHERE key IN (SELECT key FROM probes ORDER BY used LIMIT ?)",
+                                (n_entries - self.max_entries,))
+                self.db.commit()
+
+    def clear(self):
+        """Removes every binary from the cache."""
+        with self.lock:
+            self.db.execute("DELETE FROM probes")
+            self.db.execute("DELETE FROM drivers")
+            driver_programs.clear()
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def close(self):
+        """Saves the assemblers that compiler drivers run, prunes the cache and closes the database."""
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO drivers (fingerprint, program) VALUES (?, ?)",
+                                list(driver_programs.items()))
+            self.db.commit()
+        self.prune()
+        self.db.close()
+
+class CachedAssembler(Assembler):
+    """Assembler that serves binaries from a ProbeCache and only assembles misses.
+
+    Rejections are cached too: a batch holding an instruction that the
+    assembler rejected in an earlier run raises a RejectedError naming it
+    without running the assembler, so assemble_probes does not bisect it again.
+    """
+
+    def __init__(self, asm, cache):
+        """Wraps an assembler with a cache.
+
+        Args:
+            asm (Assembler): The assembler used for cache misses.
+            cache (ProbeCache): The cache to use.
+        """
+        self.asm = asm
+        self.cache = cache
+        # lookups served by this assembler, which may share its cache with others
+        self.hits = 0
+        self.misses = 0
+        # whether asm was ever invoked, and so has something to clean up
+        self.used = False
+
+    def assemble(self, instruction):
+        """Assembles a given instruction and returns the resulting binary.
+
+        Args:
+            instruction (str): The instruction to assemble.
+
+        Returns:
+            bytes: The assembled binary.
+        """
+        return self.assemble_many([instruction])[0]
+
+    def assemble_many(self, instructions):
+        """Assembles a list of instructions, assembling all cache misses in a single batch.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Raises:
+            RuntimeError: The toolchain failed (RejectedError if the assembler rejected instructions).
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        keys, binaries, misses = self.lookup(instructions)
+        message = None
+        if len(misses) > 0:
+            self.used = True
+            try:
+                self.store(keys, binaries, misses, self.asm.assemble_many(list(misses)))
+            except RuntimeError as error:
+                if not self.reject(keys, binaries, misses, error):
+                    raise
+                message = str(error)
+        return self.check_rejected(instructions, binaries, message)
+
+    async def assemble_many_async(self, instructions):
+        """Assembles a list of instructions without blocking the event loop, assembling all cache misses in a single batch.
+
+        The sqlite lookups and inserts run on the event loop's default
+        executor, so they do not block other templates.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Raises:
+            RuntimeError: The toolchain failed (RejectedError if the assembler rejected instructions).
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        loop = asyncio.get_running_loop()
+        keys, binaries, misses = await loop.run_in_executor(None, self.lookup, instructions)
+        message = None
+        if len(misses) > 0:
+            self.used = True
+            try:
+                assembled = await self.asm.assemble_many_async(list(misses))
+            except RuntimeError as error:
+                if not await loop.run_in_executor(None, self.reject, keys, binaries, misses, error):
+                    raise
+                message = str(error)
+            else:
+                await loop.run_in_executor(None, self.store, keys, binaries, misses, assembled)
+        return self.check_rejected(instructions, binaries, message)
+
+    def lookup(self, instructions):
+        """Looks up a list of instructions in the cache.
+
+        Args:
+            instructions (list(str)): The instructions to look up.
+
+        Returns:
+            tuple(list(str), list(bytes | None), dict(str, list(int))): The cache key and cached binary
+                of each instruction, and the positions of each distinct instruction that missed.
+        """
+        identity = self.asm.identity()
+        keys = [ProbeCache.key(identity, instruction) for instruction in instructions]
+        binaries = self.cache.get_many(keys)
+
+        # a probe can appear several times in a batch, only assemble it once
+        misses = {}
+        for i, binary in enumerate(binaries):
+            if binary is None:
+                misses.setdefault(instructions[i], []).append(i)
+        n_misses = binaries.count(None)
+        self.hits += len(binaries) - n_misses
+        self.misses += n_misses
+        return keys, binaries, misses
+
+    def store(self, keys, binaries, misses, assembled):
+        """Fills in and caches the binaries assembled for the misses of a lookup().
+
+        Args:
+            keys (list(str)): The keys returned by lookup().
+            binaries (list(bytes | None)): The binaries returned by lookup(), filled in place.
+            misses (dict(str, list(int))): The misses returned by lookup().
+            assembled (list(bytes)): The binary of each miss, in order.
+        """
+        for source, binary in zip(misses, assembled):
+            for i in misses[source]:
+                binaries[i] = binary
+        self.cache.put_many([(keys[misses[source][0]], binary) for source, binary in zip(misses, assembled)])
+
+    def reject(self, keys, binaries, misses, error):
+        """Caches the misses of a lookup() that the assembler rejected.
+
+        Only rejections that the assembler attributed to instructions are
+        cached; any other error may be a passing failure of the toolchain.
+
+        Args:
+            keys (list(str)): The keys returned by lookup().
+            binaries (list(bytes | None)): The binaries returned by lookup(), where REJECTED is filled in place.
+            misses (dict(str, list(int))): The misses returned by lookup().
+            error (RuntimeError): The error raised when assembling the misses.
+
+        Returns:
+            bool: Whether the rejected misses were known and cached.
+        """
+        if not isinstance(error, RejectedError) or error.rejected is None:
+            return False
+        sources = list(misses)
+        rejected = [sources[i] for i in error.rejected]
+        for source in rejected:
+            for i in misses[source]:
+                binaries[i] = REJECTED
+        self.cache.put_many([(keys[misses[source][0]], REJECTED) for source in rejected])
+        return True
+
+    @staticmethod
+    def check_rejected(instructions, binaries, message=None):
+        """Returns the binaries of a batch, or raises if any instruction was rejected.
+
+        Args:
+            instructions (list(str)): The instructions of the batch.
+            binaries (list(bytes)): Their binaries, REJECTED for rejected instructions.
+            message (str): The error message of the assembler, if it was run and rejected some of them.
+
+        Raises:
+            RejectedError: Some instructions were rejected, in this run or an earlier one.
+
+        Returns:
+            list(bytes): The binaries.
+        """
+        rejected = [i for i, binary in enumerate(binaries) if binary == REJECTED]
+        if len(rejected) == 0:
+            return binaries
+        if message is None and len(instructions) == 1:
+            message = f"The assembler rejected `{instructions[0]}`"
+        elif message is None:
+            message = f"The assembler rejected {len(rejected)} of {len(instructions)} instructions, e.g. `{instructions[rejected[0]]}`"
+        raise RejectedError(message, rejected)
+
+    def clone(self, filepath):
+        """Creates a cached clone of the wrapped assembler that shares this cache."""
+        return CachedAssembler(self.asm.clone(filepath), self.cache)
+
+    def identity(self):
+        """Returns a string identifying everything that determines the assembled output."""
+        return self.asm.identity()
+
+    def cleanup(self):
+        """Cleans up the wrapped assembler, if it was used."""
+        if self.used:
+            self.asm.cleanup()
+
+    def arch(self):
+        """Returns a string denoting the assembler architecture."""
+        return self.asm.arch()
@@ -0,0 +1,297 @@
+import struct
+
+from decoder import WORD_FORMATS
+
+class Label:
+    """A position in a CodeBuffer, possibly referenced before it is bound."""
+
+    def __init__(self, name=None):
+        self.name = name
+        # byte offset in the buffer, None until CodeBuffer.bind
+        self.offset = None
+
+    def __repr__(self):
+        return f"Label({self.name!r}, offset={self.offset})"
+
+class Fixup:
+    """A field of an emitted instruction that holds the distance to a label, patched by CodeBuffer.finalize."""
+
+    def __init__(self, offset, entry, args, field_idx, label, shift, pc_offset):
+        self.offset = offset
+        self.entry = entry
+        self.args = args
+        self.field_idx = field_idx
+        self.label = label
+        self.shift = shift
+        self.pc_offset = pc_offset
+
+class CodeBuffer:
+    """Emits machine code with the solved instructions, without a toolchain.
+
+    Encodings are packed straight into a growable bytearray by the
+    emitter() of each instruction, in the target byte order. A branch
+    to a label that is not bound yet is emitted with a placeholder offset and
+    recorded as a fixup; finalize() patches every fixup in a single pass
+    and returns a memoryview of the code.
+    """
+
+    def __init__(self, instructions, byteorder="little", capacity=1 << 16):
+        """Creates an empty buffer.
+
+        Args:
+            instructions (dict(str, Instruction) | list(Instruction)): The solved instructions to emit.
+            byteorder (str): "little" or "big", the byte order of the target.
+            capacity (int): The initial size of the buffer in bytes; it doubles whenever it fills up.
+        """
+        if isinstance(instructions, dict):
+            instructions = instructions.values()
+        self.instructions = {instr.name: instr for instr in instructions}
+        self.byteorder = byteorder
+        self.buffer = bytearray(max(capacity, 16))
+        self.capacity = len(self.buffer)
+        # number of bytes emitted so far
+        self.size = 0
+        # {instr_name: (Instruction, encoder, Struct.pack_into | None, size in bytes)}, built on first use
+        self.entries = {}
+        # {instr_name: function} built by emitter()
+        self.emitters = {}
+        self.fixups = []
+        # {name: Label} of the labels created by label()
+        self.labels = {}
+        self.finalized = False
+
+    def entry(self, instr_name):
+        """Returns the (instruction, encoder, pack_into, size) used to emit an instruction.
+
+        Raises:
+            RuntimeError: The instruction is not known.
+        """
+        entry = self.entries.get(instr_name)
+        if entry is None:
+            instr = self.instructions.get(instr_name)
+            if instr is None:
+                raise RuntimeError(f"{instr_name} not found in solved instructions")
+            size = -(-instr.n_bits // 8)
+            pack_into = None
+            if size in WORD_FORMATS:
+                pack_into = struct.Struct(("<" if self.byteorder == "little" else ">") + WORD_FORMATS[size]).pack_into
+            entry = (instr, instr.compile(), pack_into, size)
+            self.entries[instr_name] = entry
+        return entry
+
+    def reserve(self, n_bytes):
+        """Makes room for n_bytes more bytes and returns the offset they start at.
+
+        Raises:
+            RuntimeError: The buffer was already finalized.
+        """
+        if self.finalized:
+            raise RuntimeError("Cannot emit into a finalized CodeBuffer")
+        offset = self.size
+        if offset + n_bytes > len(self.buffer):
+            self.buffer.extend(bytes(max(self.capacity, offset + n_bytes - self.capacity)))
+            self.capacity = len(self.buffer)
+        self.size = offset + n_bytes
+        return offset
+
+    def write(self, offset, entry, encoding):
+        """Packs an encoding at an offset of the buffer."""
+        _, _, pack_into, size = entry
+        if pack_into is not None:
+            pack_into(self.buffer, offset, encoding)
+        else:
+            self.buffer[offset:offset + size] = encoding.to_bytes(size, self.byteorder)
+
+    def emitter(self, instr_name):
+        """Returns a function appending an instruction, which is how instructions are emitted.
+
+        Look the function up once and call it for every instruction: a
+        lookup by name on every call would cost more than encoding with
+        Instruction.assemble() and converting to bytes.
+
+        Where the target has a machine word of the instruction's size, the
+        function is generated with the encoding expression of the instruction
+        inlined (see Instruction.encode_expression), so emitting costs a
+        single call.
+
+        Args:
+            instr_name (str): The name of the instruction.
+
+        Raises:
+            RuntimeError: The instruction is not known.
+
+        Returns:
+            function: Takes the field values (positionally in field order, or by name)
+                and returns the byte offset of the instruction. Like the compiled encoders,
+                it raises KeyError for a value a field with a table cannot encode.
+        """
+        emitter = self.emitters.get(instr_name)
+        if emitter is not None:
+            return emitter
+
+        entry = self.entry(instr_name)
+        instr, encoder, pack_into, size = entry
+        if pack_into is not None:
+            params, expression, namespace = instr.encode_expression()
+            # the generated names start with __ so they cannot clash with field names
+            # the encoding is computed first, so a value that cannot be encoded leaves no hole
+            source = (f"def emit({', '.join(params)}):\n"
+                      f"    __encoding = {expression}\n"
+                      f"    __offset = __buffer.size\n"
+                      f"    if __offset + {size} > __buffer.capacity or __buffer.finalized:\n"
+                      f"        __buffer.reserve({size})\n"
+                      f"    else:\n"
+                      f"        __buffer.size = __offset + {size}\n"
+                      f"    __pack_into(__bytes, __offset, __encoding)\n"
+                      f"    return __offset\n")
+            namespace.update({"__buffer": self, "__bytes": self.buffer, "__pack_into": pack_into})
+            exec(compile(source, f"<{instr.arch}_{instr.name} emitter>", "exec"), namespace)
+            emitter = namespace["emit"]
+        else:
+            def emitter(*args, **kwargs):
+                encoding = encoder(*args, **kwargs)
+                offset = self.reserve(size)
+                self.write(offset, entry, encoding)
+                return offset
+        self.emitters[instr_name] = emitter
+        return emitter
+
+    def emit_bytes(self, data):
+        """Appends raw bytes, e.g. a literal pool.
+
+        Returns:
+            int: The byte offset of the data.
+        """
+        offset = self.reserve(len(data))
+        self.buffer[offset:offset + len(data)] = data
+        return offset
+
+    def align(self, boundary, fill=0):
+        """Pads the code with fill bytes up to a multiple of boundary bytes."""
+        padding = -self.size % boundary
+        if padding > 0:
+            self.emit_bytes(bytes([fill]) * padding)
+
+    def label(self, name=None):
+        """Creates an unbound label.
+
+        Args:
+            name (str): A name to find the label by (self.labels[name]) and to report it by.
+
+        Raises:
+            RuntimeError: A label with the same name already exists.
+
+        Returns:
+            Label: The label.
+        """
+        if name is not None:
+            if name in self.labels:
+                raise RuntimeError(f"Duplicate label {name}")
+            self.labels[name] = Label(name)
+            return self.labels[name]
+        return Label()
+
+    def bind(self, label):
+        """Binds a label to the current end of the code.
+
+        Args:
+            label (Label | str): The label, or the name of one (created if needed).
+
+        Raises:
+            RuntimeError: The label is already bound.
+
+        Returns:
+            Label: The label.
+        """
+        if isinstance(label, str):
+            label = self.labels.get(label) or self.label(label)
+        if label.offset is not None:
+            raise RuntimeError(f"Label {label.name} is already bound to offset {label.offset}")
+        label.offset = self.size
+        return label
+
+    def emit_branch(self, instr_name, field_name, label, shift=0, pc_offset=0, **kwargs):
+        """Appends an instruction with a field holding the distance to a label.
+
+        The field gets (label offset - (instruction offset + pc_offset)) >> shift
+        once the label is bound; e.g. shift=2, pc_offset=8 for an ARM b/bl,
+        whose offset counts words from the instruction two ahead.
+
+        Args:
+            instr_name (str): The name of the instruction.
+            field_name (str): The field holding the offset.
+            label (Label | str): The target, or the name of one (created if needed).
+            shift (int): The number of low bits of the distance the field leaves out.
+            pc_offset (int): The distance in bytes from the instruction to the address the offset is relative to.
+            **kwargs (int): The values of every other field, by name.
+
+        Raises:
+            RuntimeError: The instruction has no such field, or a value is missing for another field.
+
+        Returns:
+            int: The byte offset of the instruction.
+        """
+        entry = self.entry(instr_name)
+        field_names = [field.name for field in entry[0].fields]
+        if field_name not in field_names:
+            raise RuntimeError(f"{instr_name} has no field {field_name}")
+        if isinstance(label, str):
+            label = self.labels.get(label) or self.label(label)
+
+        for name in kwargs:
+            if name not in field_names or name == field_name:
+                raise RuntimeError(f"{instr_name} has no field {name} to set besides {field_name}")
+        missing = [name for name in field_names if name != field_name and name not in kwargs]
+        if len(missing) > 0:
+            raise RuntimeError(f"{instr_name} needs values for {', '.join(missing)}")
+        field_idx = field_names.index(field_name)
+        # the offset field only gets its value in finalize(); until then it holds 0, or the
+        # first value its table can encode
+        field = entry[0].fields[field_idx]
+        args = [kwargs.get(name) for name in field_names]
+        args[field_idx] = 0
+        if field.table is not None and field.table[0] is None:
+            args[field_idx] = next(iter(field.table_values().values()))
+        offset = self.reserve(entry[3])
+        self.write(offset, entry, entry[1](*args))
+        self.fixups.append(Fixup(offset, entry, args, field_idx, label, shift, pc_offset))
+        return offset
+
+    def finalize(self):
+        """Resolves every fixup and returns the code.
+
+        No more code can be emitted afterwards.
+
+        Raises:
+            RuntimeError: A label is unbound, or a distance is misaligned or does not fit its field.
+
+        Returns:
+            memoryview: The code, a view of the underlying buffer without copying.
+        """
+        for fixup in self.fixups:
+            label = fixup.label
+            if label.offset is None:
+                raise RuntimeError(f"Label {label.name} is never bound")
+            instr, encoder = fixup.entry[:2]
+            field = instr.fields[fixup.field_idx]
+
+            distance = label.offset - (fixup.offset + fixup.pc_offset)
+            if distance & ((1 << fixup.shift) - 1):
+                raise RuntimeError(f"{instr.name} at offset {fixup.offset}: distance {distance} to {label.name} is not a multiple of {1 << fixup.shift}")
+            value = distance >> fixup.shift
+            low, high = field.value_range()
+            if not low <= value <= high:
+                raise RuntimeError(f"{instr.name} at offset {fixup.offset}: {field.name} {value} to {label.name} out of range [{low}, {high}]")
+            if field.table is not None and field.table[value & (len(field.table) - 1)] is None:
+                raise RuntimeError(f"{instr.name} at offset {fixup.offset}: {field.name} {value} to {label.name} cannot be encoded")
+
+            args = list(fixup.args)
+            args[fixup.field_idx] = value
+            self.write(fixup.offset, fixup.entry, encoder(*args))
+
+        self.fixups = []
+        self.finalized = True
+        return memoryview(self.buffer)[:self.size]
+
+    def __len__(self):
+        return self.size
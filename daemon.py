@@ -0,0 +1,367 @@
+import argparse
+import importlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import ProbeCache, CachedAssembler
+from decoder import Decoder
+from derive import main as derive_config, solve_instruction
+
+class ConfigState:
+    """A config loaded by the daemon, with its most recently solved instructions."""
+
+    def __init__(self, name):
+        """Imports a config.
+
+        Args:
+            name (str): The name of the config module.
+        """
+        self.name = name
+        self.config = importlib.import_module(name)
+        self.path = self.config.__file__
+        self.mtime = os.stat(self.path).st_mtime_ns
+        # guards the config's assembler, which regenerations and solve requests share
+        self.lock = threading.Lock()
+        # {instr_name: Instruction}, replaced as a whole on every regeneration
+        self.solved = {}
+        # {instr_name: compiled encoder}
+        self.encoders = {}
+        # {n_bits: Decoder}
+        self.decoders = {}
+
+    def changed(self):
+        """Returns whether the config file was modified since it was last loaded."""
+        try:
+            return os.stat(self.path).st_mtime_ns != self.mtime
+        except FileNotFoundError:
+            return False
+
+    def reload(self):
+        """Re-imports the config from its file."""
+        self.mtime = os.stat(self.path).st_mtime_ns
+        self.config = importlib.reload(self.config)
+
+    def publish(self, solved):
+        """Makes newly solved instructions visible to requests.
+
+        Args:
+            solved (dict(str, Instruction)): The solved instructions of the config.
+        """
+        encoders = {instr_name: instr.compile() for instr_name, instr in solved.items()}
+        by_width = {}
+        for instr in solved.values():
+            by_width.setdefault(instr.n_bits, []).append(instr)
+        decoders = {n_bits: Decoder(instructions) for n_bits, instructions in by_width.items()}
+        # requests read these without the lock, so swap complete tables in
+        self.solved, self.encoders, self.decoders = solved, encoders, decoders
+
+class DeriveDaemon:
+    """Keeps configs derived, and answers encode, decode and solve requests about them.
+
+    The configs are imported once and polled for changes; a modified config
+    is re-imported and derived again with derive.main(), which only solves
+    the templates that changed. The probe cache and the pool of assembler
+    workers stay alive between runs, and the solved instructions are kept
+    in memory for requests.
+    """
+
+    def __init__(self, config_names, jobs=1, cache=None, use_async=False, families=True, poll_interval=0.1):
+        """Loads the configs.
+
+        Args:
+            config_names (list(str)): The config modules to derive.
+            jobs (int): The number of assembler workers, shared by all configs.
+            cache (ProbeCache): The probe cache, or None to not cache.
+            use_async (bool): Whether to solve templates on an event loop.
+            families (bool): Whether to solve templates with the same operand structure as families.
+            poll_interval (float): Seconds between checks of the config files.
+        """
+        self.states = {name: ConfigState(name) for name in config_names}
+        self.jobs = jobs
+        self.cache = cache
+        self.use_async = use_async
+        self.families = families
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 and not use_async else None
+        self.stopped = threading.Event()
+
+    def regenerate(self, state):
+        """Derives a config and publishes its solved instructions.
+
+        Errors are printed rather than raised, so the daemon keeps serving the
+        previous instructions until the config is fixed.
+
+        Args:
+            state (ConfigState): The config.
+
+        Returns:
+            bool: Whether the config was derived successfully.
+        """
+        start = time.perf_counter()
+        try:
+            with state.lock:
+                solved = derive_config(state.config, self.jobs, self.cache, False, self.use_async, None, 0, None, self.executor, self.families)
+            state.publish(solved)
+        except Exception as error:
+            print(f"{state.name}: {error}")
+            return False
+        print(f"{state.name}: derived in {time.perf_counter() - start:.3f}s")
+        return True
+
+    def poll(self):
+        """Re-derives the configs whose file changed.
+
+        Returns:
+            list(str): The names of the configs that were derived again.
+        """
+        changed = []
+        for state in self.states.values():
+            if state.changed():
+                try:
+                    state.reload()
+                except Exception as error:
+                    print(f"{state.name}: {error}")
+                    continue
+                self.regenerate(state)
+                changed.append(state.name)
+        return changed
+
+    def watch(self):
+        """Derives every config, then keeps them up to date until stop() is called."""
+        for state in self.states.values():
+            self.regenerate(state)
+        while not self.stopped.wait(self.poll_interval):
+            self.poll()
+
+    def stop(self):
+        """Stops watch() and the assembler workers."""
+        self.stopped.set()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def state(self, request):
+        """Returns the config a request is about.
+
+        Raises:
+            RuntimeError: The request names no config while several are loaded, or an unknown one.
+        """
+        name = request.get("config")
+        if name is None:
+            if len(self.states) != 1:
+                raise RuntimeError("Several configs are loaded, the request must name one")
+            return next(iter(self.states.values()))
+        if name not in self.states:
+            raise RuntimeError(f"Unknown config {name}")
+        return self.states[name]
+
+    def encode(self, request):
+        """Encodes an instruction.
+
+        The request gives the instruction name and its arguments, either as a
+        {field name: value} object or as a list in field order.
+        """
+        state = self.state(request)
+        instr_name = request["instruction"]
+        args = request["args"]
+        # look up in a single table, which a regeneration may replace at any time
+        table = state.solved if isinstance(args, dict) else state.encoders
+        if instr_name not in table:
+            raise RuntimeError(f"{instr_name} not found in solved instructions")
+        if isinstance(args, dict):
+            instr = table[instr_name]
+            for field in instr.fields:
+                if field.name not in args:
+                    raise RuntimeError(f"{instr_name} needs a value for {field.name}")
+            try:
+                encoding = instr.assemble(args)
+            except RuntimeError as error:
+                raise RuntimeError(f"{error} of {instr_name}") from None
+        else:
+            try:
+                encoding = table[instr_name](*args)
+            except KeyError:
+                # the compiled encoders look up fields with a table in a dict of their encodable
+                # values, so find the field and value the lookup failed on
+                instr = state.solved.get(instr_name)
+                for field, value in zip(instr.fields if instr is not None else [], args):
+                    if field.table is not None and field.table[value & (len(field.table) - 1)] is None:
+                        raise RuntimeError(f"{value} cannot be encoded in {field.name} of {instr_name}") from None
+                raise RuntimeError(f"{args} cannot be encoded by {instr_name}") from None
+        return {"encoding": encoding}
+
+    def decode(self, request):
+        """Decodes an instruction encoding.
+
+        The request gives the word, and n_bits if the config has instructions of several widths.
+        """
+        state = self.state(request)
+        n_bits = request.get("n_bits")
+        if n_bits is None:
+            if len(state.decoders) != 1:
+                raise RuntimeError("The config has instructions of several widths, the request must give n_bits")
+            n_bits = next(iter(state.decoders))
+        if n_bits not in state.decoders:
+            raise RuntimeError(f"The config has no {n_bits} bit instructions")
+        result = state.decoders[n_bits].decode(request["word"])
+        if result is None:
+            return {"instruction": None, "args": None}
+        return {"instruction": result[0], "args": result[1]}
+
+    def solve(self, request):
+        """Solves a template that is not part of the config, with the config's assembler and regex.
+
+        The request gives the template, and optionally a name for the instruction.
+        """
+        state = self.state(request)
+        asm = state.config.asm
+        if self.cache is not None:
+            asm = CachedAssembler(asm, self.cache)
+        with state.lock:
+            try:
+                instr = solve_instruction(asm, request.get("name", "instr"), request["template"], state.config.regex)
+            finally:
+                asm.cleanup()
+        return {"instruction": instr.to_dict()}
+
+    def configs(self, request):
+        """Lists the loaded configs and how many instructions each has."""
+        return {"configs": {name: len(state.solved) for name, state in self.states.items()}}
+
+    def handle(self, request):
+        """Answers a request.
+
+        Args:
+            request (dict): The decoded request, whose "op" is encode, decode, solve or configs.
+
+        Returns:
+            dict: The response, with "ok" false and an "error" message if the request failed.
+        """
+        ops = {"encode": self.encode, "decode": self.decode, "solve": self.solve, "configs": self.configs}
+        try:
+            op = request.get("op")
+            if op not in ops:
+                raise RuntimeError(f"Unknown op {op}")
+            return {"ok": True, **ops[op](request)}
+        except KeyError as error:
+            return {"ok": False, "error": f"Missing {error}"}
+        except Exception as error:
+            return {"ok": False, "error": str(error)}
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request per line and writes one JSON response per line, until the client disconnects."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.daemon.handle(json.loads(line))
+            except ValueError as error:
+                response = {"ok": False, "error": f"Invalid request: {error}"}
+            self.wfile.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+            self.wfile.flush()
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server answering requests with a DeriveDaemon, one thread per connection."""
+
+    daemon_threads = True
+
+    def __init__(self, path, daemon):
+        """Binds the socket, replacing a stale socket file.
+
+        Args:
+            path (str): The path of the socket.
+            daemon (DeriveDaemon): The daemon answering the requests.
+        """
+        self.daemon = daemon
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+class DaemonClient:
+    """Client of a running daemon, keeping one connection open across requests."""
+
+    def __init__(self, path):
+        """Connects to a daemon.
+
+        Args:
+            path (str): The path of the daemon's socket.
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile("rwb")
+
+    def request(self, op, **params):
+        """Sends a request and waits for its response.
+
+        Args:
+            op (str): encode, decode, solve or configs.
+            **params: The parameters of the request, e.g. instruction and args for encode.
+
+        Raises:
+            RuntimeError: The daemon reported an error.
+
+        Returns:
+            dict: The response.
+        """
+        self.file.write(json.dumps({"op": op, **params}, separators=(",", ":")).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise RuntimeError("The daemon closed the connection")
+        response = json.loads(line)
+        if not response.pop("ok"):
+            raise RuntimeError(response["error"])
+        return response
+
+    def close(self):
+        """Closes the connection."""
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep configs derived as they change, and serve encode, decode and solve requests over a Unix socket.")
+    parser.add_argument("configs", metavar="config", nargs="+", help="The configuration python files to use (without .py).")
+    parser.add_argument("-s", "--socket", default="derive.sock", help="The Unix socket to listen on (default: derive.sock).")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="The number of assembler processes to run in parallel.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Solve templates concurrently on an event loop, with up to JOBS assembler processes at once.")
+    parser.add_argument("--no-families", action="store_true", help="Probe every template in full, even if it shares its operands with another template.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the probe cache.")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the probe cache (default: $XDG_CACHE_HOME/derive-py).")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Seconds between checks of the config files for changes (default 0.1).")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else ProbeCache(args.cache_dir)
+    daemon = DeriveDaemon(args.configs, args.jobs, cache, args.use_async, not args.no_families, args.poll_interval)
+    server = DaemonServer(args.socket, daemon)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Listening on {args.socket}")
+    # stop cleanly (removing the socket) on SIGTERM as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stopped.set())
+    try:
+        daemon.watch()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.stop()
+        if cache is not None:
+            cache.close()
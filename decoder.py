@@ -0,0 +1,270 @@
+import mmap
+import struct
+
+import bitwise
+from instruction import field_table_name
+
+# struct format character for each supported instruction width in bytes
+WORD_FORMATS = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+def field_expression(field, word="word"):
+    """Generates an expression that reads a field out of an instruction encoding.
+
+    The expression uses only shifts, masks, xor and subtraction, so it is
+    valid as both Python and C (where word is unsigned).
+
+    Args:
+        field (Field): The field to read.
+        word (str): The name of the variable holding the encoding.
+
+    Returns:
+        str: The expression, sign-extending the value if the field is signed.
+    """
+    parts = []
+    for mask, shift in field.runs():
+        if shift >= 0:
+            parts.append(f"(({word} >> {shift}) & 0x{mask:x})")
+        else:
+            parts.append(f"(({word} << {-shift}) & 0x{mask:x})")
+    value = " | ".join(parts) if len(parts) > 0 else "0"
+    if field.signed and len(field.locs) > 0:
+        sign_bit = 1 << (len(field.locs) - 1)
+        value = f"((({value}) ^ 0x{sign_bit:x}) - 0x{sign_bit:x})"
+    return value
+
+class DecodeEntry:
+    """An instruction as seen by the decoder: the bits it fixes and how to read its fields."""
+
+    def __init__(self, index, instr):
+        """Computes the fixed bits of a solved instruction.
+
+        Args:
+            index (int): The position of the instruction in the decoder.
+            instr (Instruction): The solved instruction.
+        """
+        self.index = index
+        self.instr = instr
+
+        field_bits = 0
+        for field in instr.fields:
+            field_bits |= field.instr_mask()
+        # bits that are the same in every encoding of the instruction, and their values
+        self.mask = bitwise.NOT(field_bits, instr.n_bits)
+        self.match = instr.opcode & self.mask
+
+        # generated function returning the field values of an encoding
+        terms = []
+        namespace = {}
+        for i, field in enumerate(instr.fields):
+            if field.table is not None:
+                # values the bits cannot come from decode to None
+                namespace[f"__values{i}"] = field.table_values()
+                terms.append(f"{field.name!r}: __values{i}.get(word & 0x{field.instr_mask():x})")
+            else:
+                terms.append(f"{field.name!r}: {field_expression(field)}")
+        exec(compile(f"def extract(word):\n    return {{{', '.join(terms)}}}\n",
+                     f"<{instr.arch}_{instr.name} decoder>", "exec"), namespace)
+        self.extract = namespace["extract"]
+
+class DecodeNode:
+    """Node of the decode tree.
+
+    The node looks at the key_mask bits, which every one of its instructions
+    fixes, and dispatches on their value with a dict. Buckets that still hold
+    several instructions get their own node when those share more fixed bits,
+    and otherwise are scanned from the most to the least specific instruction.
+    """
+
+    def __init__(self, entries, used_mask=0, max_scan=4):
+        """Builds the node (and its children) for a list of entries.
+
+        Args:
+            entries (list(DecodeEntry)): The instructions to tell apart.
+            used_mask (int): Bits already dispatched on by the parent nodes.
+            max_scan (int): Buckets with at most this many entries are scanned linearly.
+        """
+        self.key_mask = 0
+        if len(entries) > 0:
+            self.key_mask = entries[0].mask
+            for entry in entries[1:]:
+                self.key_mask &= entry.mask
+
+        # more specific instructions first, so e.g. add (shift fixed to 0) wins over add_lsl
+        self.entries = sorted(entries, key=lambda entry: (-bitwise.bit_count(entry.mask), entry.index))
+        self.buckets = {}
+        for entry in self.entries:
+            self.buckets.setdefault(entry.match & self.key_mask, []).append(entry)
+
+        # {key: DecodeNode} for buckets that can be split further
+        self.children = {}
+        for key, bucket in self.buckets.items():
+            if len(bucket) > max_scan:
+                child_mask = bucket[0].mask
+                for entry in bucket[1:]:
+                    child_mask &= entry.mask
+                if child_mask & ~(self.key_mask | used_mask) != 0:
+                    self.children[key] = DecodeNode(bucket, used_mask | self.key_mask, max_scan)
+
+    def lookup(self, word):
+        """Returns the DecodeEntry of the instruction that word encodes, or None."""
+        key = word & self.key_mask
+        child = self.children.get(key)
+        if child is not None:
+            return child.lookup(word)
+        for entry in self.buckets.get(key, ()):
+            if word & entry.mask == entry.match:
+                return entry
+        return None
+
+class Decoder:
+    """Classifies and decodes instruction encodings using the fixed bits of solved instructions."""
+
+    def __init__(self, instructions):
+        """Builds the decode tree.
+
+        Args:
+            instructions (list(Instruction)): Solved instructions, all of the same width.
+
+        Raises:
+            RuntimeError: The instructions do not all have the same width.
+        """
+        self.entries = [DecodeEntry(i, instr) for i, instr in enumerate(instructions)]
+        self.n_bits = None
+        for instr in instructions:
+            if self.n_bits is None:
+                self.n_bits = instr.n_bits
+            elif instr.n_bits != self.n_bits:
+                raise RuntimeError(f"Cannot decode {instr.n_bits} bit {instr.name} together with {self.n_bits} bit instructions")
+        self.root = DecodeNode(self.entries)
+
+    def decode(self, word):
+        """Decodes a single instruction encoding.
+
+        Args:
+            word (int): The instruction encoding.
+
+        Returns:
+            tuple(str, dict(str, int)) | None: The instruction name and its field values,
+                or None if no instruction matches.
+        """
+        entry = self.root.lookup(word)
+        if entry is None:
+            return None
+        return entry.instr.name, entry.extract(word)
+
+    def decode_stream(self, buffer, byteorder="little"):
+        """Decodes consecutive instructions from a buffer.
+
+        Decoded words are memoized, so repeated encodings are only decoded once;
+        the args dicts of repeated words are shared and must not be modified.
+
+        Args:
+            buffer (bytes-like): The instructions, e.g. an mmap of a binary image.
+                Trailing bytes that do not make up a whole instruction are ignored.
+            byteorder (str): "little" or "big", the byte order of the target.
+
+        Yields:
+            tuple(int, int, str | None, dict | None): (byte offset, word, name, args) for each
+                instruction, with name and args None if the word is not recognized.
+        """
+        size = self.n_bits // 8
+        if self.n_bits % 8 != 0 or size not in WORD_FORMATS:
+            raise RuntimeError(f"Cannot stream {self.n_bits} bit instructions")
+        word_format = ("<" if byteorder == "little" else ">") + WORD_FORMATS[size]
+
+        view = memoryview(buffer).cast("B")
+        view = view[:len(view) - len(view) % size]
+        # {word: (name, args)}
+        decoded = {}
+        offset = 0
+        for word, in struct.iter_unpack(word_format, view):
+            result = decoded.get(word)
+            if result is None:
+                result = self.decode(word) or (None, None)
+                decoded[word] = result
+            yield offset, word, result[0], result[1]
+            offset += size
+
+    def decode_file(self, path, byteorder="little"):
+        """Decodes the instructions of a raw binary file through an mmap.
+
+        Args:
+            path (str): The binary file.
+            byteorder (str): "little" or "big", the byte order of the target.
+
+        Yields:
+            tuple(int, int, str | None, dict | None): See decode_stream.
+        """
+        with open(path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                yield from self.decode_stream(image, byteorder)
+
+    def to_c(self, emit_enum=True):
+        """Generates a C decoder for the instructions.
+
+        The generated function switches on the bits every instruction fixes
+        and then tests each candidate's mask and match, most specific first.
+        Fields with a table are decoded by searching the C array of the table
+        (see instruction.field_tables_c), which the encoders emitted before
+        the decoder define.
+
+        Args:
+            emit_enum (bool): Whether to define the enum of the instructions, which
+                instruction.to_c_table() also defines.
+
+        Returns:
+            str: C source defining an enum of the instructions and a decode function.
+        """
+        if len(self.entries) == 0:
+            return ""
+
+        arch = self.entries[0].instr.arch
+        word_type = f"uint{self.n_bits}_t"
+        constants = [f"{entry.instr.arch}_{entry.instr.name}".upper() for entry in self.entries]
+
+        result = ""
+        if emit_enum:
+            result += f"enum {arch}_instruction {{\n"
+            for constant in constants:
+                result += f"    {constant},\n"
+            result += "};\n\n"
+
+        # fields with a table are decoded by searching the table emitted with the encoders
+        for entry in self.entries:
+            for field in entry.instr.fields:
+                if field.table is not None:
+                    table = field_table_name(entry.instr, field)
+                    result += f"static inline {word_type} {table}_lookup({word_type} bits) {{\n"
+                    result += f"    for ({word_type} value = 0; value < {len(field.table)}; value++) {{\n"
+                    result += f"        if ({table}[value] == bits) {{\n"
+                    if field.signed:
+                        sign_bit = len(field.table) // 2
+                        result += f"            return (value ^ 0x{sign_bit:x}) - 0x{sign_bit:x};\n"
+                    else:
+                        result += "            return value;\n"
+                    result += "        }\n"
+                    result += "    }\n"
+                    result += "    return 0;\n"
+                    result += "}\n\n"
+
+        result += f"/* Decodes word; on a match, stores the field values in args (in template order) and returns the {arch}_instruction, otherwise returns -1. */\n"
+        result += f"static inline int {arch}_decode({word_type} word, {word_type} *args) {{\n"
+        result += f"    switch (word & 0x{self.root.key_mask:x}) {{\n"
+        for key, bucket in self.root.buckets.items():
+            result += f"    case 0x{key:x}:\n"
+            for entry in bucket:
+                result += f"        if ((word & 0x{entry.mask:x}) == 0x{entry.match:x}) {{\n"
+                for i, field in enumerate(entry.instr.fields):
+                    if field.table is not None:
+                        result += f"            args[{i}] = {field_table_name(entry.instr, field)}_lookup(word & 0x{field.instr_mask():x});\n"
+                    else:
+                        result += f"            args[{i}] = {field_expression(field)};\n"
+                result += f"            return {constants[entry.index]};\n"
+                result += "        }\n"
+            result += "        break;\n"
+        result += "    }\n"
+        result += "    return -1;\n"
+        result += "}"
+        return result
@@ -1,57 +1,241 @@
+import asyncio
 import importlib
+import os
+import random
 import re
 import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import time
 
 import bitwise
-from instruction import Instruction, Field
+from assembler import AssemblerPool, RejectedError
+from cache import ProbeCache, CachedAssembler
+from manifest import Manifest
+from decoder import Decoder
+from instrdb import database_bytes
+from instrument import Profile, ProfiledAssembler, RoundCounter, write_report
+from instruction import Instruction, Field, to_c_table
+
+# widest non-linear field (in bits, including the sign) that probe_tables() probes value by value
+MAX_TABLE_BITS = 12
+
+def fill_template(template, matches, values):
+    """Substitutes a value for every matched argument of a template.
 
-def solve_instruction(asm, instr_name, template, regex):
-    """Solves a template and prints the resulting assembly.
-    
     Args:
-        asm (Assembler): The assembler to use.
+        template (str): The template.
+        matches (list(re.Match)): The matched arguments of the template.
+        values (list(int)): The value to insert for each match.
+
+    Returns:
+        str: The filled template.
+    """
+    result = ""
+    last = 0
+    for match, value in zip(matches, values):
+        result += template[last:match.start()] + str(value)
+        last = match.end()
+    return result + template[last:]
+
+def parse_fields(matches):
+    """Parses the name and width of every matched argument.
+
+    Args:
+        matches (list(re.Match)): The matched arguments of a template.
+
+    Returns:
+        list(tuple(str, int, int)): (field_name, field_width, neg) for each match, where
+            neg is 1 if the field also takes negative values and 0 otherwise.
+    """
+    fields = []
+    for curr_match in matches:
+        field_name = curr_match.group(1)
+        field_width = int(curr_match.group(2))
+        neg = 0
+        if field_width < 0:
+            field_width *= -1
+            neg = 1
+        fields.append((field_name, field_width, neg))
+    return fields
+
+def probe_instruction(arch, instr_name, template, regex):
+    """Solves a template from the binaries of its probes.
+
+    This is a generator: it yields lists of probe strings that need to be
+    assembled, is sent back the list of resulting binaries (in the same order,
+    with None for any probe the assembler rejected), and returns the solved
+    Instruction. Keeping the assembler out of the solver lets the caller
+    assemble the probes of many templates in a single batch.
+
+    Args:
+        arch (str): The architecture name.
         instr_name (str): The name of the instruction.
         template (str): The template to solve.
         regex (str): The regular expression to use to match the template arguments.
 
+    Raises:
+        RuntimeError: A probe could not be assembled or the encoding is not solvable.
+
     Returns:
         Instruction: The instruction that was solved from the given information.
     """
 
-    instruction = Instruction(asm.arch(), instr_name)
-
     matches = list(re.finditer(regex, template))
-    # field_widths = {match.group(1): int(match.group(2)) for match in matches}
-
-    # for instruction as a whole
-    instr_always_0 = None
-    instr_always_1 = None
 
     if len(matches) == 0:
         # no arguments
-        binary = asm.assemble(template)
-        instr_always_1 = binary
+        binary, = yield [template]
+        if binary is None:
+            raise RuntimeError(f"Error assembling instruction: `{template}`")
+        instruction = Instruction(arch, instr_name)
+        instruction.set_opcode(binary)
+        return instruction
 
-    # iterate through each matched location in the template
-    for i in range(len(matches)):
-                
+    fields = parse_fields(matches)
+    instruction = yield from probe_fields_together(arch, instr_name, template, matches, fields)
+    instruction = yield from complete_instruction(arch, instr_name, template, matches, fields, instruction)
+    return instruction
 
-        curr_match = matches[i]
+def complete_instruction(arch, instr_name, template, matches, fields, instruction):
+    """Finishes solving a template after probe_fields_together.
 
-        field_name = curr_match.group(1)
-        field_width = int(curr_match.group(2))
-        neg = 0
-        if field_width < 0:
-            field_width *= -1
-            neg = 1
+    If probe_fields_together failed, the fields are probed separately; the
+    fields are then checked (and tabulated if needed) by probe_tables. This
+    is a generator following the protocol of probe_instruction.
 
-        # for the current field
-        field_always_0 = None
-        field_always_1 = None
+    Args:
+        arch (str): The architecture name.
+        instr_name (str): The name of the instruction.
+        template (str): The template to solve.
+        matches (list(re.Match)): The matched arguments of the template.
+        fields (list(tuple)): The output of parse_fields(matches).
+        instruction (Instruction | None): The result of probe_fields_together.
 
-        # stores the binary for each bit_pos
-        encodings = []
+    Returns:
+        Instruction: The solved instruction.
+    """
+    if instruction is None:
+        print(f"Probing the fields of {instr_name} separately")
+        instruction = yield from probe_fields_separately(arch, instr_name, template, matches, fields)
+    instruction = yield from probe_tables(arch, instr_name, template, matches, fields, instruction)
+    return instruction
+
+def probe_fields_together(arch, instr_name, template, matches, fields):
+    """Solves a template by setting bits of every field in the same probes.
+
+    Every positive bit of every field gets a distinct nonzero id, and probe j
+    sets exactly the bits whose id has bit j set. Comparing each probe against
+    the all-zero baseline, the probes in which an instruction bit flips spell
+    out the id of the field bit that drives it. This takes about log2 of the
+    total field width in probes instead of the total width.
+
+    One more probe with every field set to all ones checks that bits
+    superpose, and negative fields get one probe each for their sign bit. If
+    any probe is rejected or any check fails, None is returned so the caller
+    can fall back to probe_fields_separately.
+
+    Args:
+        arch (str): The architecture name.
+        instr_name (str): The name of the instruction.
+        template (str): The template to solve.
+        matches (list(re.Match)): The matched arguments of the template.
+        fields (list(tuple)): The output of parse_fields(matches).
+
+    Returns:
+        Instruction | None: The solved instruction, or None if the fields interfere.
+    """
+
+    # [(field index, bit_pos)] of every positive field bit, indexed by id - 1
+    bits = [(i, bit_pos) for i, (_, field_width, _) in enumerate(fields) for bit_pos in range(field_width)]
+    n_coded = len(bits).bit_length()
+
+    probes = [fill_template(template, matches, [0] * len(fields))]
+    for j in range(n_coded):
+        values = [0] * len(fields)
+        for bit_id, (i, bit_pos) in enumerate(bits, 1):
+            if (bit_id >> j) & 1:
+                values[i] |= 1 << bit_pos
+        probes.append(fill_template(template, matches, values))
+    probes.append(fill_template(template, matches, [(1 << field_width) - 1 for _, field_width, _ in fields]))
+    # fields that take negative values, probed one at a time with the most negative value
+    signed = [i for i, (_, _, neg) in enumerate(fields) if neg]
+    for i in signed:
+        values = [0] * len(fields)
+        values[i] = -1 * (1 << (fields[i][1] - 1))
+        probes.append(fill_template(template, matches, values))
+
+    binaries = yield probes
+    if None in binaries:
+        return None
+    baseline, *encodings = [bitwise.to_int(binary) for binary in binaries]
+    n_bits = len(binaries[0]) * 8
+    coded = encodings[:n_coded]
+    all_ones = encodings[n_coded]
+    sign_encodings = encodings[n_coded + 1:]
+
+    # spell out the id of the field bit that drives each changed instruction bit
+    bit_ids = {}
+    for j, encoding in enumerate(coded):
+        for instr_idx in bitwise.set_bits(encoding ^ baseline):
+            bit_ids[instr_idx] = bit_ids.get(instr_idx, 0) | (1 << j)
+    instr_idxs = [[] for _ in bits]
+    for instr_idx, bit_id in sorted(bit_ids.items()):
+        if bit_id > len(bits):
+            return None
+        instr_idxs[bit_id - 1].append(instr_idx)
+
+    # every field bit has to drive exactly one instruction bit that is 0 in the baseline
+    field_mask = 0
+    for instr_idx_list in instr_idxs:
+        if len(instr_idx_list) != 1:
+            return None
+        field_mask |= 1 << instr_idx_list[0]
+    if baseline & field_mask != 0 or all_ones != baseline | field_mask:
+        return None
 
+    locs = [{} for _ in fields]
+    for (i, bit_pos), (instr_idx,) in zip(bits, instr_idxs):
+        locs[i][bit_pos] = instr_idx
+
+    # the sign bit is the one bit the most negative value sets besides the top positive bit
+    for i, encoding in zip(signed, sign_encodings):
+        field_width = fields[i][1]
+        sign_bits = (encoding ^ baseline) & ~(1 << locs[i][field_width - 1])
+        if encoding & baseline != baseline or sign_bits & field_mask != 0 or bitwise.bit_count(sign_bits) != 1:
+            return None
+        locs[i][field_width] = bitwise.FLS(sign_bits)
+
+    instruction = Instruction(arch, instr_name)
+    for (field_name, _, neg), field_locs in zip(fields, locs):
+        field = Field(field_name, neg == 1)
+        for field_idx in sorted(field_locs):
+            field.set_instr_idx(field_idx, field_locs[field_idx])
+        instruction.add_fields(field)
+    instruction.set_opcode(baseline, n_bits)
+    return instruction
+
+def probe_fields_separately(arch, instr_name, template, matches, fields):
+    """Solves a template by probing one bit of one field at a time, with every other field zeroed.
+
+    Args:
+        arch (str): The architecture name.
+        instr_name (str): The name of the instruction.
+        template (str): The template to solve.
+        matches (list(re.Match)): The matched arguments of the template.
+        fields (list(tuple)): The output of parse_fields(matches).
+
+    Raises:
+        RuntimeError: A probe could not be assembled or the encoding is not solvable.
+
+    Returns:
+        Instruction: The solved instruction.
+    """
+
+    instruction = Instruction(arch, instr_name)
+
+    probes = []
+    for i, (field_name, field_width, neg) in enumerate(fields):
         for bit_pos in range(field_width + neg):
             value = 1 << bit_pos
             if bit_pos == field_width:
@@ -59,115 +243,1002 @@ def solve_instruction(asm, instr_name, template, regex):
                 value = -1 * (1 << (field_width - 1))
 
             # insert current option into selected location, zero everything else
-            filled_template = template[:curr_match.start()] + str(value) + template[curr_match.end():]
-            filled_template = re.sub(regex, "0", filled_template)
-            
-            # # generate binary for instruction
-            binary = asm.assemble(filled_template)
+            values = [0] * len(fields)
+            values[i] = value
+            probes.append(fill_template(template, matches, values))
 
-            # setup always_0 and always_1 to match length of instruction
-            if instr_always_0 is None:
-                instr_always_0 = bytes([0xFF for _ in range(len(binary))])
-                instr_always_1 = bytes([0xFF for _ in range(len(binary))])
-            if field_always_0 is None:
-                field_always_0 = bytes([0xFF for _ in range(len(binary))])
-                field_always_1 = bytes([0xFF for _ in range(len(binary))])
+    # generate binary for every probe at once
+    binaries = yield probes
+    for probe, binary in zip(probes, binaries):
+        if binary is None:
+            raise RuntimeError(f"Error assembling instruction: `{probe}`")
+    n_bits = len(binaries[0]) * 8
+    all_bits = bitwise.mask(n_bits)
+    binaries = [bitwise.to_int(binary) for binary in binaries]
 
+    # for instruction as a whole
+    instr_always_0 = all_bits
+    instr_always_1 = all_bits
 
-            field_always_0 = bitwise.AND(field_always_0, bitwise.NOT(binary))
-            field_always_1 = bitwise.AND(field_always_1, binary)
+    # iterate through each matched location in the template
+    probe_idx = 0
+    for field_name, field_width, neg in fields:
 
-            encodings.append(binary)
+        # for the current field
+        field_always_0 = all_bits
+        field_always_1 = all_bits
 
-        both_0_and_1 = bitwise.AND(field_always_0, field_always_1) 
-        if (bitwise.to_int(both_0_and_1) != 0):
-            raise RuntimeError(f"Impossible, some bits are both always 0 and 1: {both_0_and_1}")
+        # stores the binary for each bit_pos
+        encodings = binaries[probe_idx:probe_idx + field_width + neg]
+        probe_idx += field_width + neg
+
+        for binary in encodings:
+            field_always_0 &= ~binary
+            field_always_1 &= binary
+
+        both_0_and_1 = field_always_0 & field_always_1
+        if (both_0_and_1 != 0):
+            raise RuntimeError(f"Impossible, some bits are both always 0 and 1: {both_0_and_1:x}")
 
-        field_unchanged = bitwise.OR(field_always_0, field_always_1)
-        field_bits = bitwise.NOT(field_unchanged)
-        
-        field = Field(field_name)
+        field_unchanged = field_always_0 | field_always_1
+        field_bits = bitwise.NOT(field_unchanged, n_bits)
+
+        field = Field(field_name, neg == 1)
 
         for field_idx in range(field_width + neg):
-            one_hot = bitwise.AND(field_bits, encodings[field_idx])
-            instr_idx = bitwise.FFS(one_hot)
+            one_hot = field_bits & encodings[field_idx]
+            instr_idx = bitwise.FLS(one_hot)
             field.set_instr_idx(field_idx, instr_idx)
-        
+
         instruction.add_fields(field)
 
-        instr_always_0 = bitwise.AND(instr_always_0, field_always_0)
-        instr_always_1 = bitwise.AND(instr_always_1, field_always_1)
+        instr_always_0 &= field_always_0
+        instr_always_1 &= field_always_1
 
-    instruction.set_opcode(instr_always_1)
+    instruction.set_opcode(instr_always_1, n_bits)
     # print(instruction.to_c_function())
     return instruction
 
-def test_instruction(asm, instr: Instruction, args, assembly):
-    """Tests a single instruction's solved encoding against the expected encoding.
+def mixed_value(field_width, neg, seed):
+    """Returns a fixed pseudo-random value of a field with several bits set.
+
+    Args:
+        field_width (int): The width of the field.
+        neg (int): 1 if the field takes negative values, in which case the value is negative.
+        seed (int): Selects the value.
+
+    Returns:
+        int: The value.
+    """
+    value = ((seed + 1) * 0x9E3779B97F4A7C15 >> 17) & ((1 << field_width) - 1)
+    return value - (1 << field_width) if neg else value
+
+def superposition_values(fields, i=None):
+    """Lists field values that check whether solved fields superpose.
+
+    The values set several bits of a field at once: all ones, two
+    complementary patterns of alternating bits, two pseudo-random values
+    (negative for fields that take negative values) and every pair of
+    adjacent bits, which assemblers accept even for fields that only take
+    a few bit patterns, like rotated immediates. If any of them changes the
+    encoding differently from the OR of the single bits, the field is not
+    linear.
+
+    Args:
+        fields (list(tuple)): The output of parse_fields() for the template.
+        i (int): Only set field i (to isolate a non-linear field), or None to set every field at once.
+
+    Returns:
+        list(list(int)): The value of each field in each probe.
+    """
+    max_width = max([field_width for _, field_width, _ in fields], default=0)
+    columns = []
+    for j, (_, field_width, neg) in enumerate(fields):
+        ones = (1 << field_width) - 1
+        alternating = sum(1 << bit_pos for bit_pos in range(field_width) if (bit_pos + j) % 2 == 0)
+        column = [ones, alternating, alternating ^ ones, mixed_value(field_width, 0, j), mixed_value(field_width, neg, j + 1)]
+        column += [3 << bit_pos if bit_pos + 1 < field_width else 0 for bit_pos in range(max_width - 1)]
+        if i is not None and j != i:
+            column = [0] * len(column)
+        columns.append(column)
+    # single bit values are already known to encode correctly
+    values = [list(row) for row in zip(*columns) if any(bitwise.bit_count(value) > 1 or value < 0 for value in row)]
+    return list(map(list, dict.fromkeys(map(tuple, values))))
+
+def probe_tables(arch, instr_name, template, matches, fields, instruction):
+    """Checks that the fields of a solved instruction superpose, and tabulates the fields that do not.
+
+    The solvers assume every field bit drives one instruction bit, which
+    does not hold for e.g. rotated immediates. First every field is set to
+    superposition_values() at once; if an accepted probe changes the encoding
+    of the all-zero probe differently from the solved instruction, each field
+    is probed on its own to find the
+    non-linear ones, which are then probed on every value of their range and
+    get a Field.table. This is a generator following the protocol of
+    probe_instruction.
+
+    Args:
+        arch (str): The architecture name.
+        instr_name (str): The name of the instruction.
+        template (str): The template to solve.
+        matches (list(re.Match)): The matched arguments of the template.
+        fields (list(tuple)): The output of parse_fields(matches).
+        instruction (Instruction): The instruction solved assuming linear fields.
+
+    Raises:
+        RuntimeError: A non-linear field is wider than MAX_TABLE_BITS or shares bits with another field.
+
+    Returns:
+        Instruction: The instruction, with tables for its non-linear fields.
+    """
+    mask = bitwise.mask(instruction.n_bits)
+    zeros = [0] * len(fields)
+
+    def mismatches(values, binaries):
+        # whether each probe was accepted and changes the all-zero encoding (the first binary)
+        # differently from the solution; a linear solution of a sign-magnitude field can get
+        # the all-zero encoding itself wrong, which would otherwise be blamed on the other fields
+        base = 0 if binaries[0] is None else bitwise.to_int(binaries[0])
+        expected_base = 0 if binaries[0] is None else instruction.assemble({field.name: 0 for field in instruction.fields}) & mask
+        results = []
+        for probe_values, binary in zip(values, binaries[1:]):
+            args = {field.name: value for field, value in zip(instruction.fields, probe_values)}
+            results.append(binary is not None and instruction.assemble(args) & mask ^ expected_base != bitwise.to_int(binary) ^ base)
+        return results
+
+    values = superposition_values(fields)
+    if len(values) == 0:
+        return instruction
+    binaries = yield [fill_template(template, matches, probe_values) for probe_values in [zeros] + values]
+    if not any(mismatches(values, binaries)):
+        return instruction
+
+    # (field index, values) of every probe setting one field at a time
+    isolated = [(i, probe_values) for i in range(len(fields)) for probe_values in superposition_values(fields, i)]
+    binaries = yield [fill_template(template, matches, probe_values) for probe_values in [zeros] + [probe_values for _, probe_values in isolated]]
+    nonlinear = sorted({i for (i, _), mismatch in zip(isolated, mismatches([probe_values for _, probe_values in isolated], binaries)) if mismatch})
+    if len(nonlinear) == 0:
+        print(f"The fields of {instr_name} only disagree in combination, keeping the linear solution")
+        return instruction
+
+    # every value of each non-linear field, with the other fields zeroed, after the all-zero baseline
+    probes = [fill_template(template, matches, [0] * len(fields))]
+    for i in nonlinear:
+        field_name, field_width, neg = fields[i]
+        if field_width + neg > MAX_TABLE_BITS:
+            raise RuntimeError(f"{field_name} of {instr_name} is not linear and too wide to tabulate "
+                               f"({field_width + neg} bits, at most {MAX_TABLE_BITS})")
+        for index in range(1 << (field_width + neg)):
+            probe_values = [0] * len(fields)
+            probe_values[i] = index if index < (1 << field_width) else index - (1 << (field_width + neg))
+            probes.append(fill_template(template, matches, probe_values))
+    binaries = yield probes
+    if binaries[0] is None:
+        raise RuntimeError(f"Error assembling instruction: `{probes[0]}`")
+    baseline = bitwise.to_int(binaries[0])
+
+    # the table of a field holds all the bits any of its values changes (for sign-magnitude
+    # fields, that includes bits set in the baseline), so that fields still combine with OR
+    tables = {}
+    opcode = baseline
+    offset = 1
+    for i in nonlinear:
+        field_width, neg = fields[i][1:]
+        encodings = [None if binary is None else bitwise.to_int(binary)
+                     for binary in binaries[offset:offset + (1 << (field_width + neg))]]
+        offset += 1 << (field_width + neg)
+        region = 0
+        for encoding in encodings:
+            if encoding is not None:
+                region |= encoding ^ baseline
+        tables[i] = [None if encoding is None else encoding & region for encoding in encodings]
+        opcode &= ~region
+
+    result = Instruction(arch, instr_name)
+    linear_mask = 0
+    for i, ((field_name, _, neg), field) in enumerate(zip(fields, instruction.fields)):
+        if i in tables:
+            field = Field(field_name, neg == 1)
+            field.set_table(tables[i])
+        else:
+            linear_mask |= field.instr_mask()
+        result.add_fields(field)
+    for i in nonlinear:
+        if result.fields[i].instr_mask() & linear_mask != 0:
+            raise RuntimeError(f"{fields[i][0]} of {instr_name} cannot be tabulated: it shares bits with other fields")
+        linear_mask |= result.fields[i].instr_mask()
+    result.set_opcode(opcode, instruction.n_bits)
+    print(f"Tabulated the non-linear fields of {instr_name}: {', '.join(fields[i][0] for i in nonlinear)}")
+    return result
+
+def merge_solvers(solvers, count_probes=None):
+    """Runs several solvers in lockstep as a single solver.
+
+    Each round, the probes of every unfinished solver are yielded together
+    and the binaries sent back are split between them.
+
+    Args:
+        solvers (dict(str, generator)): Map from a key to a solver following the protocol of probe_instruction.
+        count_probes (callable): If given, called with the number of probes of each key before every round
+            (see instrument.RoundCounter).
+
+    Returns:
+        dict: Map from each key to the value its solver returned, in the order of solvers.
+    """
+    results = {}
+    pending = {}
+    for key, solver in solvers.items():
+        try:
+            pending[key] = next(solver)
+        except StopIteration as done:
+            results[key] = done.value
+
+    while len(pending) > 0:
+        probes = []
+        for key_probes in pending.values():
+            probes += key_probes
+        if count_probes is not None:
+            count_probes({key: len(key_probes) for key, key_probes in pending.items()})
+        binaries = yield probes
+
+        offset = 0
+        next_pending = {}
+        for key, key_probes in pending.items():
+            key_binaries = binaries[offset:offset + len(key_probes)]
+            offset += len(key_probes)
+            try:
+                next_pending[key] = solvers[key].send(key_binaries)
+            except StopIteration as done:
+                results[key] = done.value
+        pending = next_pending
+
+    return {key: results[key] for key in solvers}
+
+def family_key(template, regex):
+    """Returns the operand structure of a template: everything after its mnemonic.
+
+    Templates with the same key differ only in their mnemonic (e.g. add and
+    sub, or the condition code variants of one instruction), so they are
+    expected to share their field layout.
+
+    Args:
+        template (str): The template.
+        regex (str): The regular expression to use to match the template arguments.
+
+    Returns:
+        str | None: The key, or None if the template has no operands or an operand in its mnemonic.
+    """
+    parts = template.split(None, 1)
+    if len(parts) < 2 or re.search(regex, parts[0]) is not None or re.search(regex, parts[1]) is None:
+        return None
+    return parts[1]
+
+def probe_family(arch, members, regex, count_probes=None):
+    """Solves templates that share their operand structure (see family_key).
+
+    Every member is probed by probe_fields_together, all in the same round.
+    The first template is then solved in full. Every other template whose
+    probes give the same field layout as the first only differs from it in
+    its opcode, and skips the superposition check of probe_tables, which the
+    first template passed; templates whose layout differs, and the members
+    of a family whose first template has tabulated fields, are solved in
+    full after all. This is a generator following the protocol of
+    probe_instruction.
+
+    Args:
+        arch (str): The architecture name.
+        members (list(tuple(str, str))): The (instr_name, template) of every member, representative first.
+        regex (str): The regular expression to use to match the template arguments.
+        count_probes (callable): If given, called with the number of probes of each member before every round.
+
+    Raises:
+        RuntimeError: A probe could not be assembled or an encoding is not solvable.
+
+    Returns:
+        dict(str, Instruction): The solved instruction of each member.
+    """
+    (instr_name, template), *siblings = members
+    if len(siblings) == 0:
+        return (yield from merge_solvers({instr_name: probe_instruction(arch, instr_name, template, regex)}, count_probes))
+
+    # (template, matches, fields) of every member
+    parsed = {}
+    for member_name, member_template in members:
+        matches = list(re.finditer(regex, member_template))
+        parsed[member_name] = (member_template, matches, parse_fields(matches))
+    together = yield from merge_solvers({member_name: probe_fields_together(arch, member_name, *parsed[member_name])
+                                         for member_name, _ in members}, count_probes)
+
+    def layout(instruction):
+        return [field.to_dict() for field in instruction.fields]
+
+    representative = together[instr_name]
+    solvers = {instr_name: complete_instruction(arch, instr_name, *parsed[instr_name], representative)}
+    confirmed = {}
+    for sibling_name, _ in siblings:
+        sibling = together[sibling_name]
+        if representative is not None and sibling is not None and layout(sibling) == layout(representative):
+            confirmed[sibling_name] = sibling
+        else:
+            print(f"{sibling_name} does not share the fields of {instr_name}, solving it separately")
+            solvers[sibling_name] = complete_instruction(arch, sibling_name, *parsed[sibling_name], sibling)
+    solved = yield from merge_solvers(solvers, count_probes)
+
+    if any(field.table is not None for field in solved[instr_name].fields):
+        # the confirmed siblings skipped the superposition check on the grounds that the first template is linear
+        solved.update((yield from merge_solvers({sibling_name: probe_tables(arch, sibling_name, *parsed[sibling_name], sibling)
+                                                 for sibling_name, sibling in confirmed.items()}, count_probes)))
+    else:
+        solved.update(confirmed)
+    return {member_name: solved[member_name] for member_name, _ in members}
+
+def assemble_probes(asm, probes):
+    """Assembles a batch of probes, tolerating probes that the assembler rejects.
+
+    If the assembler says which probes it rejected, the others are
+    assembled in one more batch; if it rejected the batch without saying
+    which, the batch is bisected to find the rejected probes. Failures of
+    the toolchain itself are not rejections and are raised.
 
     Args:
         asm (Assembler): The assembler to use.
-        instr (Instruction): The instruction to test. 
+        probes (list(str)): The probes to assemble.
+
+    Raises:
+        RuntimeError: The toolchain failed.
+
+    Returns:
+        list(bytes | None): The binary of each probe, or None if it was rejected.
+    """
+    if len(probes) == 0:
+        return []
+    try:
+        return asm.assemble_many(probes)
+    except RejectedError as error:
+        if error.rejected is not None:
+            rejected = set(error.rejected)
+            accepted = [i for i in range(len(probes)) if i not in rejected]
+            binaries = [None] * len(probes)
+            for i, binary in zip(accepted, assemble_probes(asm, [probes[i] for i in accepted])):
+                binaries[i] = binary
+            return binaries
+        if len(probes) <= 1:
+            return [None] * len(probes)
+        mid = len(probes) // 2
+        return assemble_probes(asm, probes[:mid]) + assemble_probes(asm, probes[mid:])
+
+def run_solvers(asm, solvers, on_round=None):
+    """Runs probe_instruction generators to completion.
+
+    Each round, the probes requested by every unfinished solver are assembled
+    together as a single batch.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        solvers (dict(str, generator)): Map from instruction name to its solver.
+        on_round (callable): If given, called with the time taken to assemble each round.
+
+    Returns:
+        dict(str, Instruction): The solved instructions, in the order of solvers.
+    """
+    merged = merge_solvers(solvers)
+    try:
+        probes = next(merged)
+        while True:
+            start = time.perf_counter()
+            binaries = assemble_probes(asm, probes)
+            if on_round is not None:
+                on_round(time.perf_counter() - start)
+            probes = merged.send(binaries)
+    except StopIteration as done:
+        return done.value
+
+async def assemble_probes_async(asm, probes, limit, on_batch=None):
+    """Assembles a batch of probes without blocking the event loop, tolerating probes that the assembler rejects.
+
+    If the assembler says which probes it rejected, the others are
+    assembled in one more batch; if it rejected the batch without saying
+    which, the halves of the batch are bisected concurrently to find the
+    rejected probes. Failures of the toolchain itself are not rejections and
+    are raised.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        probes (list(str)): The probes to assemble.
+        limit (asyncio.Semaphore): Limits the number of batches being assembled at once.
+        on_batch (callable): If given, called with the time each batch took to assemble,
+            not counting the wait for the limit.
+
+    Raises:
+        RuntimeError: The toolchain failed.
+
+    Returns:
+        list(bytes | None): The binary of each probe, or None if it was rejected.
+    """
+    if len(probes) == 0:
+        return []
+    try:
+        async with limit:
+            start = time.perf_counter()
+            try:
+                return await asm.assemble_many_async(probes)
+            finally:
+                if on_batch is not None:
+                    on_batch(time.perf_counter() - start)
+    except RejectedError as error:
+        if error.rejected is not None:
+            rejected = set(error.rejected)
+            accepted = [i for i in range(len(probes)) if i not in rejected]
+            binaries = [None] * len(probes)
+            for i, binary in zip(accepted, await assemble_probes_async(asm, [probes[i] for i in accepted], limit, on_batch)):
+                binaries[i] = binary
+            return binaries
+        if len(probes) <= 1:
+            return [None] * len(probes)
+        mid = len(probes) // 2
+        first, second = await asyncio.gather(assemble_probes_async(asm, probes[:mid], limit, on_batch),
+                                             assemble_probes_async(asm, probes[mid:], limit, on_batch))
+        return first + second
+
+async def run_solver_async(asm, solver, limit, on_round=None):
+    """Runs a probe_instruction generator to completion, assembling each round as soon as it is requested.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        solver (generator): The solver.
+        limit (asyncio.Semaphore): Limits the number of batches being assembled at once.
+        on_round (callable): If given, called with the time taken to assemble each round,
+            not counting the wait for the limit.
+
+    Returns:
+        Instruction: The solved instruction.
+    """
+    probes = next(solver)
+    while True:
+        seconds = []
+        binaries = await assemble_probes_async(asm, probes, limit, seconds.append)
+        if on_round is not None:
+            on_round(sum(seconds))
+        try:
+            probes = solver.send(binaries)
+        except StopIteration as done:
+            return done.value
+
+async def run_solvers_async(asm, solvers, concurrency, on_round=None):
+    """Runs probe_instruction generators concurrently.
+
+    Rather than waiting for every solver to finish a round, each solver
+    submits its next round as soon as its previous one is assembled, with at
+    most concurrency batches being assembled at any time.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        solvers (dict(str, generator)): Map from instruction name to its solver.
+        concurrency (int): The maximum number of batches being assembled at once.
+        on_round (dict(str, callable)): If given, the on_round callback of run_solver_async() for each solver.
+
+    Returns:
+        dict(str, Instruction): The solved instructions, in the order of solvers.
+    """
+    limit = asyncio.Semaphore(concurrency)
+    if on_round is None:
+        on_round = {}
+    results = await asyncio.gather(*[run_solver_async(asm, solver, limit, on_round.get(key)) for key, solver in solvers.items()])
+    return dict(zip(solvers, results))
+
+def solve_instruction(asm, instr_name, template, regex):
+    """Solves a template and prints the resulting assembly.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        instr_name (str): The name of the instruction.
+        template (str): The template to solve.
+        regex (str): The regular expression to use to match the template arguments.
+
+    Returns:
+        Instruction: The instruction that was solved from the given information.
+    """
+    solver = probe_instruction(asm.arch(), instr_name, template, regex)
+    return run_solvers(asm, {instr_name: solver})[instr_name]
+
+def solve_instructions(asm, templates, regex, concurrency=None, profile=None, families=True):
+    """Solves a list of templates.
+
+    By default, each round of probes of all templates is assembled in one
+    batch. With a concurrency, the templates are instead solved concurrently
+    on an event loop, each assembling its own batches.
+
+    Templates with the same operand structure (see family_key) are solved as
+    a family by probe_family, so only the first of them is probed in full.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        templates (list): List of (instr_name, template) tuples.
+        regex (str): The regular expression to use to match the template arguments.
+        concurrency (int): The maximum number of batches being assembled at once, or None to solve in lockstep.
+        profile (Profile): If given, charges each template its share of the time taken to assemble its probes.
+        families (bool): Whether to solve templates with the same operand structure as families.
+
+    Raises:
+        RuntimeError: Two templates have the same instruction name.
+
+    Returns:
+        dict(str, Instruction): The solved instructions, in template order.
+    """
+    # {family key or instr_name: [(instr_name, template)]}, so templates without a family are on their own
+    members = {}
+    names = set()
+    for instr_name, template in templates:
+        if instr_name in names:
+            raise RuntimeError(f"Duplicate instruction name: {instr_name}")
+        names.add(instr_name)
+        key = family_key(template, regex) if families else None
+        members.setdefault(("family", key) if key is not None else ("template", instr_name), []).append((instr_name, template))
+
+    # one solver per family, named after its first member and returning {instr_name: Instruction}
+    solvers = {}
+    # the probes of each round are counted per template, in lockstep for all solvers or separately under asyncio
+    counters = {}
+    counter = RoundCounter(profile) if profile is not None else None
+    for family in members.values():
+        instr_name = family[0][0]
+        if profile is not None:
+            if len(family) > 1:
+                profile.record_family([member_name for member_name, _ in family])
+            counters[instr_name] = counter if concurrency is None else RoundCounter(profile)
+        count_probes = counters[instr_name].count if instr_name in counters else None
+        solvers[instr_name] = probe_family(asm.arch(), family, regex, count_probes)
+
+    if concurrency is not None:
+        results = asyncio.run(run_solvers_async(asm, solvers, concurrency,
+                                                {key: round_counter.charge for key, round_counter in counters.items()}))
+    else:
+        results = run_solvers(asm, solvers, None if counter is None else counter.charge)
+
+    solved = {}
+    for family_solved in results.values():
+        solved.update(family_solved)
+    # reported once solved, so a template that fails is never listed as solved
+    for instr_name, _ in templates:
+        print(f"Solved {instr_name}")
+    return {instr_name: solved[instr_name] for instr_name, _ in templates}
+
+def check_instruction(instr: Instruction, args, assembly, binary):
+    """Checks a single instruction's solved encoding against an assembled binary.
+
+    Args:
+        instr (Instruction): The instruction to test.
         args (list): The arguments to use in the instruction.
-        assembly (str): The assembly to use as ground truth.
+        assembly (str): The assembly that was used as ground truth.
+        binary (bytes): The assembled binary of assembly.
 
     Raises:
-        RuntimeError: _description_
+        RuntimeError: The test case is malformed or the encodings differ.
     """
     for field in instr.fields:
         if field.name not in args:
             raise RuntimeError(f"Bad test {assembly}: {field.name} not found in args")
 
     actual = instr.assemble(args)
-    expected = bitwise.to_int(asm.assemble(assembly))
+    expected = bitwise.to_int(binary)
     if actual != expected:
         raise RuntimeError(f"{assembly} failed: Got {actual:x} but expected {expected:x}")
 
-def main(config):
-    # Assembler object that gives .assemble and .cleanup methods
-    asm = config.asm
-    # List of (instr_name, template, list of argument names)
-    templates = config.templates
-    # Regular expression to match arguments in templates
-    regex = config.regex
-    # Output header file
-    output_file = config.output_file
-    # List of (instr_name, arguments, expected encoding)
-    test_cases = config.test_cases
-
-    # {instr_name: Instruction}
-    solved = {}
+def test_instruction(asm, instr: Instruction, args, assembly):
+    """Tests a single instruction's solved encoding against the expected encoding.
 
-    # Solve instructions
-    for instr_name, template in templates:
-        if instr_name in solved:
-            raise RuntimeError(f"Duplicate instruction name: {instr_name}")
-        print(f"Solving {instr_name}")
-        solved[instr_name] = solve_instruction(asm, instr_name, template, regex)
+    Args:
+        asm (Assembler): The assembler to use.
+        instr (Instruction): The instruction to test.
+        args (list): The arguments to use in the instruction.
+        assembly (str): The assembly to use as ground truth.
+
+    Raises:
+        RuntimeError: The test case is malformed or the encodings differ.
+    """
+    check_instruction(instr, args, assembly, asm.assemble(assembly))
+
+def test_instructions(asm, solved, test_cases, profile=None):
+    """Tests solved instructions, assembling the ground truth of every test case in one batch.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        solved (dict(str, Instruction)): The solved instructions.
+        test_cases (list): List of (instr_name, arguments, assembly) tuples.
+        profile (Profile): If given, records how long each test case takes, i.e. the time
+            to check it plus an even share of the time to assemble the batch.
 
-    # Test instructions
-    print(f"Running test cases")
+    Raises:
+        RuntimeError: A test case refers to an unknown instruction or fails.
+    """
     for instr_name, args, assembly in test_cases:
         if instr_name not in solved:
             raise RuntimeError(f"{instr_name} not found in solved instructions")
-        test_instruction(asm, solved[instr_name], args, assembly)
 
-    print(f"Successfully ran {len(test_cases)} test cases")
+    start = time.perf_counter()
+    binaries = asm.assemble_many([assembly for _, _, assembly in test_cases])
+    # the batch is assembled in one call, which cannot be attributed to single test cases
+    assemble_seconds = (time.perf_counter() - start) / max(len(test_cases), 1)
+    for (instr_name, args, assembly), binary in zip(test_cases, binaries):
+        start = time.perf_counter()
+        check_instruction(solved[instr_name], args, assembly, binary)
+        if profile is not None:
+            profile.record_test(instr_name, assembly, time.perf_counter() - start, assemble_seconds)
+
+def random_values(fields, rng):
+    """Draws random values for the arguments of a template, within each field's width and sign.
+
+    A quarter of the values are edge cases of the field's range (0, 1, -1,
+    the minimum and the maximum), the rest are uniform over the range.
+
+    Args:
+        fields (list(tuple)): The output of parse_fields() for the template.
+        rng (random.Random): The random number generator to use.
+
+    Returns:
+        list(int): The value of each field.
+    """
+    values = []
+    for _, field_width, neg in fields:
+        low = -(1 << field_width) if neg else 0
+        high = (1 << field_width) - 1
+        if rng.random() < 0.25:
+            values.append(rng.choice([value for value in (0, 1, -1, low, high) if low <= value <= high]))
+        else:
+            values.append(rng.randint(low, high))
+    return values
+
+def shrink_candidates(values):
+    """Lists simpler variants of a combination of field values, each moving one value toward zero.
+
+    Args:
+        values (list(int)): The field values.
+
+    Returns:
+        list(list(int)): The variants, simplest first.
+    """
+    candidates = []
+    for i, value in enumerate(values):
+        options = [0, value // 2 if value >= 0 else -(-value // 2)]
+        if value > 0:
+            # clear one bit, to isolate the bits that matter
+            options += [value & ~(1 << bit) for bit in bitwise.set_bits(value)]
+        elif value < -1:
+            options.append(-1)
+        for option in dict.fromkeys(options):
+            if option != value:
+                candidates.append(values[:i] + [option] + values[i + 1:])
+    return candidates
+
+def verify_instructions(asm, solved, templates, regex, n_cases, seed=None, batch_size=4096):
+    """Differentially tests solved instructions against the assembler on random arguments.
+
+    Every template is filled with n_cases random combinations of arguments,
+    all of which are assembled in batches of batch_size lines (rejected
+    lines are skipped, see assemble_probes) and compared against the
+    compiled encoder of the solved instruction. The first failing case of
+    each instruction is then shrunk, one field value at a time, to a
+    minimal combination that still fails.
+
+    Args:
+        asm (Assembler): The assembler to use.
+        solved (dict(str, Instruction)): The solved instructions.
+        templates (list): List of (instr_name, template) tuples.
+        regex (str): The regular expression to use to match the template arguments.
+        n_cases (int): The number of random cases per template.
+        seed (int): Seed for the random arguments.
+        batch_size (int): The number of lines assembled per batch.
+
+    Returns:
+        tuple(int, int, list(tuple(str, dict(str, int), str, int, int))): The number of cases checked,
+            the number of cases the assembler rejected, and a minimal failing case
+            (instr_name, args, assembly, actual, expected) for each instruction that failed.
+    """
+    rng = random.Random(seed)
+
+    # {instr_name: (template, matches, fields, encoder)}
+    parsed = {}
+    # (instr_name, values) of every case
+    cases = []
+    for instr_name, template in templates:
+        matches = list(re.finditer(regex, template))
+        fields = parse_fields(matches)
+        parsed[instr_name] = (template, matches, fields, solved[instr_name].compile())
+        for _ in range(n_cases if len(fields) > 0 else 1):
+            cases.append((instr_name, random_values(fields, rng)))
+
+    def run(cases):
+        # (assembly, actual, expected) of each case, or None if the assembler rejected it
+        lines = [fill_template(parsed[instr_name][0], parsed[instr_name][1], values) for instr_name, values in cases]
+        binaries = []
+        for i in range(0, len(lines), batch_size):
+            binaries += assemble_probes(asm, lines[i:i + batch_size])
+        results = []
+        for (instr_name, values), line, binary in zip(cases, lines, binaries):
+            if binary is None:
+                results.append(None)
+            else:
+                results.append((line, parsed[instr_name][3](*values), bitwise.to_int(binary)))
+        return results
+
+    rejected = 0
+    # {instr_name: values} of the first failing case of each instruction
+    failing = {}
+    for (instr_name, values), result in zip(cases, run(cases)):
+        if result is None:
+            rejected += 1
+        elif result[1] != result[2]:
+            failing.setdefault(instr_name, values)
+
+    # shrink every failing case in lockstep, assembling each round of candidates in one batch
+    shrinking = list(failing)
+    while len(shrinking) > 0:
+        candidates = [(instr_name, values) for instr_name in shrinking for values in shrink_candidates(failing[instr_name])]
+        shrunk = set()
+        for (instr_name, values), result in zip(candidates, run(candidates)):
+            if instr_name not in shrunk and result is not None and result[1] != result[2]:
+                failing[instr_name] = values
+                shrunk.add(instr_name)
+        shrinking = [instr_name for instr_name in shrinking if instr_name in shrunk]
+
+    failures = []
+    if len(failing) > 0:
+        minimal = list(failing.items())
+        for (instr_name, values), (line, actual, expected) in zip(minimal, run(minimal)):
+            args = {field_name: value for (field_name, _, _), value in zip(parsed[instr_name][2], values)}
+            failures.append((instr_name, args, line, actual, expected))
+
+    return len(cases) - rejected, rejected, failures
+
+def header_text(solved, emit_decoder=False, output_mode="inline"):
+    """Generates the contents of the output header.
+
+    Args:
+        solved (dict(str, Instruction)): The solved instructions.
+        emit_decoder (bool): Whether to also emit a C decoder for the instructions.
+        output_mode (str): "inline" for one unrolled function per instruction, or "table"
+            for const tables walked by one generic encode routine (see to_c_table).
+
+    Raises:
+        RuntimeError: The output mode is unknown.
 
-    # Write output
-    with open(output_file, "w") as f:
+    Returns:
+        str: The C source of the header.
+    """
+    text = ""
+    if output_mode == "inline":
         for instr in solved.values():
-            f.write(instr.to_c_function())
-            f.write("\n\n")
-    print(f"Wrote {len(solved)} instructions to {output_file}")
+            text += instr.to_c_function()
+            text += "\n\n"
+    elif output_mode == "table":
+        if len(solved) > 0:
+            text += to_c_table(list(solved.values()))
+            text += "\n\n"
+    else:
+        raise RuntimeError(f"Unknown output mode: {output_mode}")
+    if emit_decoder:
+        text += Decoder(list(solved.values())).to_c(emit_enum=output_mode != "table")
+        text += "\n\n"
+    return text
+
+def write_if_changed(path, text):
+    """Writes text to a file unless the file already holds exactly that text.
+
+    Args:
+        path (str): The file to write.
+        text (str | bytes): The new contents, written in binary mode if bytes.
+
+    Returns:
+        bool: Whether the file was written.
+    """
+    mode = "b" if type(text) is bytes else ""
+    if os.path.exists(path):
+        with open(path, "r" + mode) as f:
+            if f.read() == text:
+                return False
+    with open(path, "w" + mode) as f:
+        f.write(text)
+    return True
+
+def main(config, jobs=1, cache=None, force=False, use_async=False, profile=None, verify=0, seed=None, executor=None, families=True):
+    # Assembler object that gives .assemble and .cleanup methods
+    asm = config.asm
+    if profile is not None:
+        # count and time the calls that actually reach the toolchain
+        asm = ProfiledAssembler(asm, profile)
+    if jobs > 1 and not use_async:
+        # each worker assembles in its own temporary directory
+        asm = AssemblerPool(asm, jobs, executor)
+    if cache is not None:
+        # only assemble probes that were not assembled by a previous run
+        asm = CachedAssembler(asm, cache)
+    # the scratch directories of the assembler are removed however the run ends
+    try:
+        # List of (instr_name, template, list of argument names)
+        templates = config.templates
+        # Regular expression to match arguments in templates
+        regex = config.regex
+        # Output header file
+        output_file = config.output_file
+        # List of (instr_name, arguments, expected encoding)
+        test_cases = config.test_cases
+        # Record of what previous runs solved and tested
+        manifest = Manifest(getattr(config, "manifest_file", output_file + ".manifest"))
+
+        def phase(name):
+            return profile.phase(name) if profile is not None else contextlib.nullcontext()
+
+        # {instr_name: template key}
+        keys = {}
+        identity = asm.identity()
+        for instr_name, template in templates:
+            if instr_name in keys:
+                raise RuntimeError(f"Duplicate instruction name: {instr_name}")
+            keys[instr_name] = Manifest.template_key(identity, instr_name, template, regex)
+
+        # Reuse instructions whose template is unchanged since the last run
+        # {instr_name: Instruction}
+        reused = {}
+        if not force:
+            for instr_name, key in keys.items():
+                instr = manifest.instruction(key)
+                if instr is not None:
+                    reused[instr_name] = instr
+        if len(reused) > 0:
+            print(f"Reusing {len(reused)} unchanged instructions")
+        if profile is not None:
+            profile.reused = len(reused)
+
+        # Solve instructions
+        changed = [(instr_name, template) for instr_name, template in templates if instr_name not in reused]
+        with phase("solve"):
+            newly_solved = solve_instructions(asm, changed, regex, jobs if use_async else None, profile, families)
+        # {instr_name: Instruction}, in template order
+        solved = {instr_name: reused[instr_name] if instr_name in reused else newly_solved[instr_name] for instr_name in keys}
+
+        # Test instructions, skipping test cases that already passed against an unchanged instruction
+        passed = set()
+        pending_tests = []
+        for instr_name, args, assembly in test_cases:
+            if instr_name not in solved:
+                raise RuntimeError(f"{instr_name} not found in solved instructions")
+            test_key = Manifest.test_key(keys[instr_name], args, assembly)
+            passed.add(test_key)
+            if force or test_key not in manifest.passed:
+                pending_tests.append((instr_name, args, assembly))
+
+        print(f"Running test cases")
+        with phase("test"):
+            test_instructions(asm, solved, pending_tests, profile)
+
+        print(f"Successfully ran {len(pending_tests)} test cases ({len(test_cases) - len(pending_tests)} unchanged)")
 
-    asm.cleanup()
+        # Check the instructions against the assembler on random arguments
+        if verify > 0:
+            if seed is None:
+                seed = random.randrange(1 << 32)
+            print(f"Verifying {verify} random cases per template (seed {seed})")
+            with phase("verify"):
+                checked, rejected, failures = verify_instructions(asm, solved, templates, regex, verify, seed)
+            for instr_name, args, assembly, actual, expected in failures:
+                print(f"{instr_name}: {assembly} failed: Got {actual:x} but expected {expected:x} (args {args})")
+            if len(failures) > 0:
+                raise RuntimeError(f"{len(failures)} instructions failed verification (seed {seed})")
+            print(f"Verified {checked} random cases ({rejected} rejected by the assembler)")
+
+        # Write output
+        with phase("emit"):
+            if write_if_changed(output_file, header_text(solved, getattr(config, "emit_decoder", False), getattr(config, "output_mode", "inline"))):
+                print(f"Wrote {len(solved)} instructions to {output_file}")
+            else:
+                print(f"{output_file} is up to date")
+
+            # Optional database of the solved instructions, for tools without a toolchain
+            database_file = getattr(config, "database_file", None)
+            if database_file is not None:
+                if write_if_changed(database_file, database_bytes(list(solved.values()))):
+                    print(f"Wrote {len(solved)} instructions to {database_file}")
+                else:
+                    print(f"{database_file} is up to date")
+
+        with phase("manifest"):
+            manifest.save({keys[instr_name]: instr for instr_name, instr in solved.items()}, passed)
+
+        if profile is not None and cache is not None:
+            profile.cache_hits = asm.hits
+            profile.cache_misses = asm.misses
+
+        return solved
+    finally:
+        asm.cleanup()
+
+def run_configs(configs, jobs=1, cache=None, force=False, use_async=False, profiles=None, verify=0, seed=None, families=True):
+    """Derives several configs at once.
+
+    Every config runs main() on its own thread, and all of them assemble on
+    one shared pool of jobs workers (and share the cache), so the whole run
+    takes about as long as the largest config. Each config still writes its
+    own output_file and manifest.
+
+    Args:
+        configs (list(module)): The configs to derive.
+        jobs (int): The number of workers shared by all configs. With use_async, the
+            number of batches each config assembles at once.
+        cache (ProbeCache): The probe cache, or None to not cache.
+        force (bool): Whether to ignore the manifests of previous runs.
+        use_async (bool): Whether to solve templates on an event loop (one per config).
+        profiles (list(Profile)): A profile for each config, or None to not profile.
+        verify (int): The number of random verification cases per template.
+        seed (int): Seed for the verification cases.
+        families (bool): Whether to solve templates with the same operand structure as families.
+
+    Raises:
+        RuntimeError: Two configs write the same output file, or a config failed.
+    """
+    outputs = set()
+    for config in configs:
+        if config.output_file in outputs:
+            raise RuntimeError(f"Several configs write {config.output_file}")
+        outputs.add(config.output_file)
+    if profiles is None:
+        profiles = [None] * len(configs)
+
+    if len(configs) == 1:
+        main(configs[0], jobs, cache, force, use_async, profiles[0], verify, seed, None, families)
+        return
+
+    executor = None
+    if jobs > 1 and not use_async:
+        executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        with ThreadPoolExecutor(max_workers=len(configs)) as drivers:
+            futures = [drivers.submit(main, config, jobs, cache, force, use_async, profile, verify, seed, executor, families)
+                       for config, profile in zip(configs, profiles)]
+            errors = [future.exception() for future in futures]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for config, error in zip(configs, errors):
+        if error is not None:
+            raise RuntimeError(f"{config.__name__} failed: {error}") from error
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Derive assembly instructions.")
-    parser.add_argument("config", help="The configuration python file to use (without .py).")
+    parser = argparse.ArgumentParser(description="Derive assembly instructions.", fromfile_prefix_chars="@")
+    parser.add_argument("configs", metavar="config", nargs="+", help="The configuration python files to use (without .py). @FILE reads further arguments from FILE, one per line.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="The number of assembler processes to run in parallel.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Solve templates concurrently on an event loop, with up to JOBS assembler processes at once.")
+    parser.add_argument("--no-families", action="store_true", help="Probe every template in full, even if it shares its operands with another template.")
+    parser.add_argument("-f", "--force", action="store_true", help="Re-solve and re-test every instruction, ignoring the manifest of previous runs.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the probe cache.")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the probe cache before running.")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the probe cache (default: $XDG_CACHE_HOME/derive-py).")
+    parser.add_argument("--verify", metavar="N", type=int, default=0, help="Check every solved instruction against the assembler on N random argument combinations.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for --verify (default: random, printed).")
+    parser.add_argument("--profile", metavar="FILE", default=None, help="Write a JSON report of timings and assembler calls to FILE.")
+    parser.add_argument("--profile-summary", action="store_true", help="Print the slowest templates and tests at the end of the run.")
     args = parser.parse_args()
 
-    config = importlib.import_module(args.config)
+    configs = [importlib.import_module(config) for config in args.configs]
+
+    cache = None
+    if not args.no_cache:
+        cache = ProbeCache(args.cache_dir)
+        if args.clear_cache:
+            cache.clear()
+
+    profiles = None
+    if args.profile is not None or args.profile_summary:
+        profiles = [Profile(config) for config in args.configs]
+
+    run_configs(configs, args.jobs, cache, args.force, args.use_async, profiles, args.verify, args.seed, not args.no_families)
+
+    if profiles is not None:
+        if args.profile is not None:
+            write_report(profiles, args.profile)
+        if args.profile_summary:
+            for profile in profiles:
+                print(profile.summary())
 
-    main(config)
\ No newline at end of file
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,327 @@
+import array
+import mmap
+import os
+import struct
+import sys
+
+from instruction import Instruction, Field
+
+# first bytes of every database file
+DB_MAGIC = b"DRVI"
+# bump whenever the layout of the file changes
+DB_VERSION = 3
+
+# magic, version, number of instructions
+HEADER = struct.Struct("<4sHI")
+# name offset, name length, record offset, record length, sorted by name
+INDEX_ENTRY = struct.Struct("<IHII")
+# n_bits, opcode length in bytes, number of fields (followed by arch, name and opcode)
+RECORD = struct.Struct("<HHH")
+# flags (FIELD_SIGNED, FIELD_WIDE_LOCS), number of bits, number of table entries (followed
+# by the name, the Field.locs array as signed bytes, or little endian shorts if wide, and
+# for a table a bitmap of the encodable values and the instruction bits of every value,
+# big endian like the opcode)
+FIELD = struct.Struct("<BHI")
+FIELD_SIGNED = 1
+FIELD_WIDE_LOCS = 2
+# magic, version, number of instructions of a stream written by pack_instructions
+STREAM_HEADER = struct.Struct("<4sHI")
+# length of each record in such a stream
+RECORD_LENGTH = struct.Struct("<I")
+
+def pack_str(s, length_format="<B"):
+    """Packs a string as its UTF-8 length followed by its bytes."""
+    data = s.encode()
+    return struct.pack(length_format, len(data)) + data
+
+def unpack_str(buffer, offset, length_format="<B"):
+    """Unpacks a string packed by pack_str.
+
+    Returns:
+        tuple(str, int): The string and the offset just past it.
+    """
+    length, = struct.unpack_from(length_format, buffer, offset)
+    offset += struct.calcsize(length_format)
+    return bytes(buffer[offset:offset + length]).decode(), offset + length
+
+def pack_instruction(instr):
+    """Serializes a solved instruction into a database record.
+
+    Args:
+        instr (Instruction): The instruction.
+
+    Raises:
+        RuntimeError: The instruction is unsolved.
+
+    Returns:
+        bytes: The record.
+    """
+    if instr.opcode is None:
+        raise RuntimeError(f"Attempted to store the unsolved instruction {instr.name}")
+    opcode = instr.opcode.to_bytes((instr.n_bits + 7) // 8, byteorder="big")
+    record = RECORD.pack(instr.n_bits, len(opcode), len(instr.fields))
+    record += pack_str(instr.arch) + pack_str(instr.name, "<H") + opcode
+    for field in instr.fields:
+        table = field.table or []
+        locs = field.locs
+        flags = FIELD_SIGNED if field.signed else 0
+        if locs.typecode != "b":
+            flags |= FIELD_WIDE_LOCS
+            if sys.byteorder != "little":
+                locs = array.array(locs.typecode, locs)
+                locs.byteswap()
+        record += FIELD.pack(flags, len(locs), len(table)) + pack_str(field.name) + locs.tobytes()
+        if len(table) > 0:
+            valid = sum(1 << i for i, bits in enumerate(table) if bits is not None)
+            record += valid.to_bytes((len(table) + 7) // 8, byteorder="little")
+            record += b"".join((bits or 0).to_bytes(len(opcode), byteorder="big") for bits in table)
+    return record
+
+def unpack_instruction(buffer, offset):
+    """Deserializes a database record.
+
+    Args:
+        buffer (bytes-like): The database.
+        offset (int): The offset of the record.
+
+    Returns:
+        Instruction: The instruction.
+    """
+    n_bits, opcode_length, n_fields = RECORD.unpack_from(buffer, offset)
+    offset += RECORD.size
+    arch, offset = unpack_str(buffer, offset)
+    name, offset = unpack_str(buffer, offset, "<H")
+    opcode = int.from_bytes(buffer[offset:offset + opcode_length], byteorder="big")
+    offset += opcode_length
+
+    instr = Instruction(arch, name)
+    instr.set_opcode(opcode, n_bits)
+    for _ in range(n_fields):
+        flags, n_locs, n_entries = FIELD.unpack_from(buffer, offset)
+        field_name, offset = unpack_str(buffer, offset + FIELD.size)
+        field = Field(field_name, bool(flags & FIELD_SIGNED))
+        if n_locs > 0:
+            locs = array.array("h" if flags & FIELD_WIDE_LOCS else "b")
+            locs.frombytes(buffer[offset:offset + n_locs * locs.itemsize])
+            if locs.typecode == "h" and sys.byteorder != "little":
+                locs.byteswap()
+            field.locs = locs
+            offset += n_locs * locs.itemsize
+        if n_entries > 0:
+            valid = int.from_bytes(buffer[offset:offset + (n_entries + 7) // 8], byteorder="little")
+            offset += (n_entries + 7) // 8
+            table = []
+            for i in range(n_entries):
+                bits = int.from_bytes(buffer[offset:offset + opcode_length], byteorder="big")
+                table.append(bits if (valid >> i) & 1 else None)
+                offset += opcode_length
+            field.set_table(table)
+        instr.add_fields(field)
+    return instr
+
+def pack_instructions(instructions):
+    """Serializes solved instructions into a compact stream, e.g. to send them to another process.
+
+    Unlike a database, the stream has no index: the instructions are
+    kept in order and may share names (e.g. the same instruction for
+    several targets). Each is stored as its database record, in which
+    the bit positions of a field are copied straight out of its array.
+
+    Args:
+        instructions (list(Instruction)): The solved instructions.
+
+    Raises:
+        RuntimeError: An instruction is unsolved.
+
+    Returns:
+        bytes: The stream.
+    """
+    chunks = [STREAM_HEADER.pack(DB_MAGIC, DB_VERSION, len(instructions))]
+    for instr in instructions:
+        record = pack_instruction(instr)
+        chunks.append(RECORD_LENGTH.pack(len(record)))
+        chunks.append(record)
+    return b"".join(chunks)
+
+def unpack_instructions(data):
+    """Deserializes a stream written by pack_instructions.
+
+    Args:
+        data (bytes-like): The stream.
+
+    Raises:
+        RuntimeError: The data is not a stream of instructions or was written by another version.
+
+    Returns:
+        list(Instruction): The instructions, in the order they were packed.
+    """
+    if len(data) < STREAM_HEADER.size:
+        raise RuntimeError("Not a stream of instructions")
+    magic, version, count = STREAM_HEADER.unpack_from(data, 0)
+    if magic != DB_MAGIC:
+        raise RuntimeError("Not a stream of instructions")
+    if version != DB_VERSION:
+        raise RuntimeError(f"Stream of instructions has version {version}, expected {DB_VERSION}")
+    instructions = []
+    offset = STREAM_HEADER.size
+    for _ in range(count):
+        length, = RECORD_LENGTH.unpack_from(data, offset)
+        offset += RECORD_LENGTH.size
+        instructions.append(unpack_instruction(data, offset))
+        offset += length
+    return instructions
+
+def database_bytes(instructions):
+    """Serializes solved instructions into a database.
+
+    The file is a header, an index of (name, record) entries sorted by name,
+    the names, and one record per instruction, so that a single instruction
+    can be found by binary search and loaded without reading the rest.
+
+    Args:
+        instructions (list(Instruction)): The solved instructions, with distinct names.
+
+    Raises:
+        RuntimeError: Two instructions have the same name or an instruction is unsolved.
+
+    Returns:
+        bytes: The database.
+    """
+    names = [instr.name.encode() for instr in instructions]
+    if len(set(names)) != len(names):
+        raise RuntimeError("Instruction names in a database must be distinct")
+    order = sorted(range(len(instructions)), key=lambda i: names[i])
+
+    names_offset = HEADER.size + INDEX_ENTRY.size * len(instructions)
+    records_offset = names_offset + sum(len(name) for name in names)
+
+    index = []
+    name_offset = names_offset
+    record_offset = records_offset
+    records = []
+    for i in order:
+        record = pack_instruction(instructions[i])
+        index.append(INDEX_ENTRY.pack(name_offset, len(names[i]), record_offset, len(record)))
+        records.append(record)
+        name_offset += len(names[i])
+        record_offset += len(record)
+    return b"".join([HEADER.pack(DB_MAGIC, DB_VERSION, len(instructions))] + index + [names[i] for i in order] + records)
+
+def write_database(path, instructions):
+    """Writes solved instructions to a database file.
+
+    Args:
+        path (str): The file to write.
+        instructions (list(Instruction)): The solved instructions.
+    """
+    with open(path, "wb") as f:
+        f.write(database_bytes(instructions))
+
+class InstructionDatabase:
+    """Read-only view of a database file written by write_database.
+
+    The file is mmapped, and instructions are only deserialized (once) when
+    they are looked up, so opening even a large database is cheap.
+    """
+
+    def __init__(self, path):
+        """Opens a database.
+
+        Args:
+            path (str): The database file.
+
+        Raises:
+            RuntimeError: The file is not a database or was written by another version.
+        """
+        self.path = path
+        # {name: Instruction} of the instructions loaded so far
+        self.loaded = {}
+        with open(path, "rb") as f:
+            # mmap cannot map an empty file, and anything shorter than the header is not a database
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise RuntimeError(f"{path} is not an instruction database")
+            self.image = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.image, 0)
+        if magic != DB_MAGIC:
+            self.close()
+            raise RuntimeError(f"{path} is not an instruction database")
+        if version != DB_VERSION:
+            self.close()
+            raise RuntimeError(f"{path} has database version {version}, expected {DB_VERSION}")
+
+    def entry(self, i):
+        """Returns the (name, record offset) of the ith index entry."""
+        name_offset, name_length, record_offset, _ = INDEX_ENTRY.unpack_from(self.image, HEADER.size + i * INDEX_ENTRY.size)
+        return self.image[name_offset:name_offset + name_length], record_offset
+
+    def find(self, name):
+        """Binary searches the index for an instruction.
+
+        Args:
+            name (str): The name of the instruction.
+
+        Returns:
+            int | None: The offset of its record, or None if it is not in the database.
+        """
+        key = name.encode()
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            entry_name, record_offset = self.entry(mid)
+            if entry_name == key:
+                return record_offset
+            if entry_name < key:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def get(self, name):
+        """Loads a single instruction.
+
+        Args:
+            name (str): The name of the instruction.
+
+        Returns:
+            Instruction | None: The instruction, or None if it is not in the database.
+        """
+        if name not in self.loaded:
+            record_offset = self.find(name)
+            if record_offset is None:
+                return None
+            self.loaded[name] = unpack_instruction(self.image, record_offset)
+        return self.loaded[name]
+
+    def __getitem__(self, name):
+        instr = self.get(name)
+        if instr is None:
+            raise KeyError(name)
+        return instr
+
+    def __contains__(self, name):
+        return name in self.loaded or self.find(name) is not None
+
+    def __len__(self):
+        return self.count
+
+    def names(self):
+        """Returns the names of every instruction in the database, sorted."""
+        return [self.entry(i)[0].decode() for i in range(self.count)]
+
+    def load_all(self):
+        """Loads every instruction.
+
+        Returns:
+            dict(str, Instruction): The instructions, sorted by name.
+        """
+        return {name: self[name] for name in self.names()}
+
+    def close(self):
+        """Unmaps the file. Instructions that were already loaded stay usable."""
+        self.image.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,53 +1,262 @@
+import array
+import keyword
+import sys
+
 import bitwise
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class Field:
     """Class representing a field in an instruction"""
 
-    def __init__(self, name):
+    # slots instead of a __dict__, since configs can solve or load many thousands of fields
+    __slots__ = ("name", "signed", "locs", "table", "cached_runs", "cached_values")
+
+    def __init__(self, name, signed=False):
         self.name = name
-        self.locs = {}
+        # whether the top bit of the field is a sign bit
+        self.signed = signed
+        # the instruction bit of every field bit, indexed by field bit, -1 where not known;
+        # a signed char per bit, widened to a short if an instruction bit is above 127
+        self.locs = array.array("b")
+        # for fields whose bits do not each map to one instruction bit (e.g. rotated
+        # immediates): the instruction bits of every value, indexed by the value modulo
+        # len(table), with None for values that cannot be encoded; locs is then empty
+        self.table = None
+        # cached output of runs(), None when locs has changed since
+        self.cached_runs = None
+        # cached {instruction bits: value} of the table, built by extract()
+        self.cached_values = None
 
     def set_instr_idx(self, field_idx, instr_idx):
-        self.locs[field_idx] = instr_idx
+        locs = self.locs
+        if instr_idx > 127 and locs.typecode == "b":
+            locs = self.locs = array.array("h", locs)
+        if field_idx == len(locs):
+            locs.append(instr_idx)
+        else:
+            if field_idx > len(locs):
+                locs.extend([-1] * (field_idx - len(locs) + 1))
+            locs[field_idx] = instr_idx
+        self.cached_runs = None
+
+    def __getstate__(self):
+        # the caches are rebuilt on demand, so only the definition of the field is pickled
+        return self.name, self.signed, self.locs, self.table
+
+    def __setstate__(self, state):
+        self.name, self.signed, self.locs, self.table = state
+        self.cached_runs = None
+        self.cached_values = None
+
+    def set_table(self, table):
+        """Makes the field encode through a lookup table instead of bit positions.
+
+        Args:
+            table (list(int | None)): The instruction bits of every value, indexed by the
+                value modulo len(table) (a power of two), None where a value cannot be encoded.
+        """
+        self.table = table
+        self.locs = array.array("b")
+        self.cached_runs = None
+        self.cached_values = None
 
     def get_instr_idx(self, field_idx):
-        if field_idx in self.locs:
+        if field_idx < len(self.locs):
             return self.locs[field_idx]
         return -1
 
-    def generate(self, value, length):
+    def generate(self, value):
+        """Places the bits of value at their positions in the instruction.
+
+        Args:
+            value (int): The value of the field.
+
+        Raises:
+            RuntimeError: The field has a table in which the value cannot be encoded.
+
+        Returns:
+            int: The bits of the instruction encoding contributed by this field.
+        """
+        if self.table is not None:
+            bits = self.table[value & (len(self.table) - 1)]
+            if bits is None:
+                raise RuntimeError(f"{value} cannot be encoded in {self.name}")
+            return bits
         result = 0
-        for field_idx, instr_idx in self.locs.items():
-            bit = bitwise.bit_get(value, field_idx)
-            if (field_idx == -1):
-                raise RuntimeError(f"Invalid bit position {field_idx} in {self.name}")
-            result |= (bit << instr_idx)
-        return bitwise.to_bytes(result, length)
+        for mask, shift in self.runs():
+            if shift >= 0:
+                result |= (value & mask) << shift
+            else:
+                result |= (value & mask) >> -shift
+        return result
+
+    def runs(self):
+        """Groups the bits of the field into runs that move into the instruction together.
+
+        A run is the set of field bits that all move by the same shift
+        (instr_idx - field_idx), so each run can be placed with a single mask
+        and shift. Consecutive field bits that map to consecutive instruction
+        bits always share a run.
+
+        Raises:
+            RuntimeError: A field bit has no position in the instruction.
+
+        Returns:
+            list(tuple(int, int)): (mask, shift) of each run, where mask selects the field
+                bits of the run, ordered by their lowest field bit.
+        """
+        if self.cached_runs is None:
+            shifts = {}
+            for field_idx, instr_idx in enumerate(self.locs):
+                if instr_idx == -1:
+                    raise RuntimeError(f"Invalid bit position {instr_idx} for bit {field_idx} of {self.name}")
+                shift = instr_idx - field_idx
+                shifts[shift] = shifts.get(shift, 0) | (1 << field_idx)
+            self.cached_runs = [(mask, shift) for shift, mask in shifts.items()]
+        return self.cached_runs
+
+    def extract(self, word):
+        """Recovers the value of the field from an instruction encoding (the inverse of generate).
+
+        Args:
+            word (int): The instruction encoding.
+
+        Returns:
+            int | None: The value of the field, sign-extended if the field is signed
+                (None if the field has a table and no value encodes to the bits in word).
+        """
+        if self.table is not None:
+            if self.cached_values is None:
+                self.cached_values = self.table_values()
+            return self.cached_values.get(word & self.instr_mask())
+        value = 0
+        for mask, shift in self.runs():
+            if shift >= 0:
+                value |= (word >> shift) & mask
+            else:
+                value |= (word << -shift) & mask
+        if self.signed and len(self.locs) > 0:
+            sign_bit = 1 << (len(self.locs) - 1)
+            value = (value ^ sign_bit) - sign_bit
+        return value
+
+    def instr_mask(self):
+        """Returns the mask of the instruction bits the field can set."""
+        mask = 0
+        if self.table is not None:
+            for bits in self.table:
+                mask |= bits or 0
+        for instr_idx in self.locs:
+            if instr_idx >= 0:
+                mask |= 1 << instr_idx
+        return mask
+
+    def value_range(self):
+        """Returns the (lowest, highest) value the field can hold."""
+        if self.table is not None:
+            width = len(self.table).bit_length() - 1
+        else:
+            width = len(self.locs)
+        if self.signed:
+            return -(1 << (width - 1)), (1 << (width - 1)) - 1
+        return 0, (1 << width) - 1
+
+    def table_values(self):
+        """Inverts the table of the field.
+
+        Returns:
+            dict(int, int): The value (sign-extended if the field is signed) of every
+                combination of instruction bits in the table, the first in table order
+                where several values encode the same.
+        """
+        values = {}
+        for index, bits in enumerate(self.table):
+            if bits is not None:
+                value = index - len(self.table) if self.signed and index >= len(self.table) // 2 else index
+                values.setdefault(bits, value)
+        return values
+
+    def to_dict(self):
+        """Returns a JSON-serializable representation of the field."""
+        d = {"name": self.name, "signed": self.signed, "locs": list(enumerate(self.locs))}
+        if self.table is not None:
+            d["table"] = self.table
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        """Creates a field from the output of Field.to_dict."""
+        field = cls(d["name"], d["signed"])
+        for field_idx, instr_idx in d["locs"]:
+            field.set_instr_idx(field_idx, instr_idx)
+        if d.get("table") is not None:
+            field.set_table(d["table"])
+        return field
 
 class Instruction():
     """Class representing an instruction"""
 
+    __slots__ = ("arch", "name", "opcode", "n_bits", "fields")
+
     def __init__(self, arch, name):
         """Initializes the Instruction.
 
         Args:
             arch (str): The architecture name.
             name (str): The name of the instruction.
-            opcode (bytes): The opcode of the instruction (always_0 | always_1)
-            args (dict): Dictionary mapping argument names to their offsets
+            opcode (int): The opcode of the instruction (always_0 | always_1)
+            n_bits (int): The width of the instruction in bits
+            fields (list(Field)): The fields of the instruction
         """
         self.arch = arch
         self.name = name
         self.opcode = None
+        self.n_bits = None
         self.fields = []
 
     def add_fields(self, *fields):
         self.fields += fields
 
-    def set_opcode(self, opcode):
-        if type(opcode) is not bytes:
-            raise RuntimeError("opcode must be bytes object")
+    def __getstate__(self):
+        return self.arch, self.name, self.opcode, self.n_bits, self.fields
+
+    def __setstate__(self, state):
+        self.arch, self.name, self.opcode, self.n_bits, self.fields = state
+
+    def set_opcode(self, opcode, n_bits=None):
+        """Sets the opcode, i.e. the encoding of the instruction with every field set to 0.
+
+        Args:
+            opcode (bytes | int): The opcode, as assembled bytes or as an int.
+            n_bits (int): The width of the instruction in bits (required if opcode is an int).
+        """
+        if type(opcode) is bytes:
+            n_bits = len(opcode) * 8
+            opcode = bitwise.to_int(opcode)
+        elif type(opcode) is not int or n_bits is None:
+            raise RuntimeError("opcode must be a bytes object or an int with a width")
         self.opcode = opcode
+        self.n_bits = n_bits
+
+    def to_dict(self):
+        """Returns a JSON-serializable representation of the instruction."""
+        return {"arch": self.arch,
+                "name": self.name,
+                "opcode": bitwise.to_hex(self.opcode),
+                "n_bits": self.n_bits,
+                "fields": [field.to_dict() for field in self.fields]}
+
+    @classmethod
+    def from_dict(cls, d):
+        """Creates an instruction from the output of Instruction.to_dict."""
+        instruction = cls(d["arch"], d["name"])
+        instruction.set_opcode(int(d["opcode"], 16), d["n_bits"])
+        instruction.add_fields(*[Field.from_dict(field) for field in d["fields"]])
+        return instruction
 
     def assemble(self, args):
         """Assembles the instruction with the given arguments.
@@ -65,18 +274,170 @@ class Instruction():
         if self.opcode is None:
             raise RuntimeError("Attempted to assemble an unsolved instruction")
         
-        result = bitwise.to_int(self.opcode)
+        result = self.opcode
         for field in self.fields:
-            field_bytes = field.generate(args[field.name], len(self.opcode))
-            result |= bitwise.to_int(field_bytes)
+            result |= field.generate(args[field.name])
 
         return result
 
 
+    def encode_expression(self):
+        """Generates the Python expression computing the encoding, as used by compile().
+
+        Fields with a table are looked up in a dict of their encodable values,
+        so the expression raises KeyError for a value such a field cannot encode.
+
+        Raises:
+            RuntimeError: A field bit has no position.
+
+        Returns:
+            tuple(list(str), str, dict): The parameter name of each field (the field name,
+                or argN where that is not a valid identifier), the expression over them,
+                and the globals the expression needs (the tables, named __tableN).
+        """
+        params = []
+        terms = [f"0x{self.opcode:x}"]
+        namespace = {}
+        for i, field in enumerate(self.fields):
+            param = field.name
+            if not param.isidentifier() or keyword.iskeyword(param) or param in params:
+                param = f"arg{i}"
+            params.append(param)
+
+            if field.table is not None:
+                namespace[f"__table{i}"] = {index: bits for index, bits in enumerate(field.table) if bits is not None}
+                terms.append(f"__table{i}[{param} & 0x{len(field.table) - 1:x}]")
+            for mask, shift in field.runs():
+                if shift >= 0:
+                    terms.append(f"(({param} & 0x{mask:x}) << {shift})")
+                else:
+                    terms.append(f"(({param} >> {-shift}) & 0x{mask >> -shift:x})")
+        return params, " | ".join(terms), namespace
+
+    def compile(self):
+        """Generates a specialized encoder for the instruction.
+
+        The encoder is Python source compiled at runtime: the opcode is folded
+        in as a constant and each run of field bits (see Field.runs) is placed
+        with a single mask and shift, so encoding does not walk the fields
+        bit by bit.
+
+        Raises:
+            RuntimeError: The instruction is unsolved or a field bit has no position.
+
+        Returns:
+            function: An encoder taking the field values (positionally in the
+                order of self.fields, or by field name) and returning the
+                instruction encoding as an int. It raises KeyError for a value
+                that a field with a table cannot encode.
+        """
+
+        if self.opcode is None:
+            raise RuntimeError("Attempted to compile an unsolved instruction")
+
+        params, expression, namespace = self.encode_expression()
+        func_name = f"encode_{self.arch}_{self.name}"
+        if not func_name.isidentifier():
+            func_name = "encode"
+        source = f"def {func_name}({', '.join(params)}):\n    return {expression}\n"
+        exec(compile(source, f"<{self.arch}_{self.name} encoder>", "exec"), namespace)
+        encoder = namespace[func_name]
+        encoder.source = source
+        return encoder
+
+    def assemble_batch(self, columns, out=None, offset=0, byteorder="little", count=None):
+        """Encodes many instances of the instruction into one contiguous buffer.
+
+        The encodings are computed a column at a time with NumPy when it is
+        installed, and with the compiled encoder otherwise, then written to
+        out without creating a bytes object per instruction.
+
+        Args:
+            columns (dict(str, sequence)): Map from field name to the value of that field in
+                every row (a list, array.array or any buffer-protocol object).
+            out (bytearray | memoryview): Writable buffer to encode into (a new bytearray if None).
+            offset (int): Byte offset in out of the first encoding.
+            byteorder (str): "little" or "big", the byte order of the target.
+            count (int): The number of rows (only required if the instruction has no fields).
+
+        Raises:
+            RuntimeError: A column is missing or has the wrong length, out is too small,
+                or a field with a table cannot encode one of its values.
+
+        Returns:
+            bytearray | memoryview: out, holding the encodings at out[offset:offset + count * n_bits // 8].
+        """
+
+        if self.opcode is None:
+            raise RuntimeError("Attempted to assemble an unsolved instruction")
+        for field in self.fields:
+            if field.name not in columns:
+                raise RuntimeError(f"Missing column {field.name} for {self.name}")
+
+        values = [columns[field.name] for field in self.fields]
+        if count is None:
+            if len(values) == 0:
+                raise RuntimeError(f"{self.name} has no fields, the number of rows must be given")
+            count = len(values[0])
+        for field, column in zip(self.fields, values):
+            if len(column) != count:
+                raise RuntimeError(f"Column {field.name} has {len(column)} rows but expected {count}")
+
+        size = -(-self.n_bits // 8)
+        if out is None:
+            out = bytearray(offset + count * size)
+        view = memoryview(out).cast("B")
+        if offset + count * size > len(view):
+            raise RuntimeError(f"Buffer of {len(view)} bytes is too small for {count} encodings at offset {offset}")
+
+        if numpy is not None and size in (1, 2, 4, 8):
+            words = numpy.full(count, self.opcode, dtype=numpy.uint64)
+            for field, column in zip(self.fields, values):
+                column = numpy.asarray(column).astype(numpy.int64)
+                if field.table is not None:
+                    indices = column & (len(field.table) - 1)
+                    valid = numpy.array([bits is not None for bits in field.table])
+                    if not valid[indices].all():
+                        raise RuntimeError(f"{column[~valid[indices]][0]} cannot be encoded in {field.name}")
+                    table = numpy.array([bits or 0 for bits in field.table], dtype=numpy.uint64)
+                    words |= table[indices]
+                for mask, shift in field.runs():
+                    if shift >= 0:
+                        words |= ((column & mask) << shift).astype(numpy.uint64)
+                    else:
+                        words |= ((column >> -shift) & (mask >> -shift)).astype(numpy.uint64)
+            dtype = numpy.dtype(f"{'<' if byteorder == 'little' else '>'}u{size}")
+            numpy.frombuffer(view, dtype=dtype, count=count, offset=offset)[:] = words
+            return out
+
+        encoder = self.compile()
+        if len(values) > 0:
+            encodings = map(encoder, *values)
+            if any(field.table is not None for field in self.fields):
+                try:
+                    encodings = list(encodings)
+                except KeyError as error:
+                    raise RuntimeError(f"{error.args[0]} cannot be encoded in a table field of {self.name}") from None
+        else:
+            encodings = (self.opcode for _ in range(count))
+
+        typecodes = [typecode for typecode in "BHILQ" if array.array(typecode).itemsize == size]
+        if len(typecodes) > 0:
+            words = array.array(typecodes[0], encodings)
+            if byteorder != sys.byteorder:
+                words.byteswap()
+            view[offset:offset + count * size] = memoryview(words).cast("B")
+        else:
+            # no machine type of this width, write the encodings one at a time
+            for i, encoding in enumerate(encodings):
+                view[offset + i * size:offset + (i + 1) * size] = encoding.to_bytes(size, byteorder)
+        return out
+
     def to_c_function(self):
-        n_bits = len(self.opcode) * 8
+        n_bits = self.n_bits
         
-        result = f"static inline uint{n_bits}_t {self.arch}_{self.name}("
+        result = field_tables_c(self)
+        result += f"static inline uint{n_bits}_t {self.arch}_{self.name}("
         for i, field in enumerate(self.fields):
             if (i == 0):
                 result += f"uint{n_bits}_t {field.name}"
@@ -86,9 +447,22 @@ class Instruction():
         result += ") {\n"
 
         for field in self.fields:
-            result += f"    uint{n_bits}_t {field.name}_field = 0;\n"
-            for field_idx, instr_idx in field.locs.items():
-                result += f"    {field.name}_field |= (({field.name} >> {field_idx}) & 1) << {instr_idx};\n"
+            # one mask and shift per run of bits instead of one statement per bit
+            terms = []
+            if field.table is not None:
+                terms.append(f"{field_table_name(self, field)}[{field.name} & 0x{len(field.table) - 1:x}]")
+            for mask, shift in field.runs():
+                if shift > 0:
+                    terms.append(f"(({field.name} & 0x{mask:x}) << {shift})")
+                elif shift == 0:
+                    terms.append(f"({field.name} & 0x{mask:x})")
+                else:
+                    terms.append(f"(({field.name} >> {-shift}) & 0x{mask >> -shift:x})")
+            if len(terms) == 0:
+                terms.append("0")
+            result += f"    uint{n_bits}_t {field.name}_field = {' | '.join(terms)};\n"
+
+        if len(self.fields) > 0:
             result += "\n"
 
         result += f"    return 0x{bitwise.to_hex(self.opcode)}"
@@ -100,3 +474,138 @@ class Instruction():
 
         return result
 
+
+def field_table_name(instr, field):
+    """Returns the name of the C array holding the table of a field."""
+    return f"{instr.arch}_{instr.name}_{field.name}_table"
+
+def field_tables_c(instr):
+    """Generates the C arrays holding the tables of the fields of an instruction that have one.
+
+    Values a field cannot encode get all ones in its array, which yields an
+    invalid encoding, so C code must only pass valid values.
+
+    Args:
+        instr (Instruction): The instruction.
+
+    Returns:
+        str: The definitions, each followed by a blank line, or "" if no field has a table.
+    """
+    result = ""
+    for field in instr.fields:
+        if field.table is None:
+            continue
+        invalid = bitwise.mask(instr.n_bits)
+        entries = [f"0x{invalid if bits is None else bits:x}" for bits in field.table]
+        result += f"/* instruction bits of every value of {field.name}, indexed by the value masked to {len(field.table).bit_length() - 1} bits (all ones where it cannot be encoded) */\n"
+        result += f"static const uint{instr.n_bits}_t {field_table_name(instr, field)}[{len(field.table)}] = {{\n"
+        for i in range(0, len(entries), 8):
+            result += f"    {', '.join(entries[i:i + 8])},\n"
+        result += "};\n\n"
+    return result
+
+def to_c_table(instructions):
+    """Generates a table-driven C encoder for a list of instructions.
+
+    Instead of one unrolled function per instruction, the opcodes and the
+    (argument, mask, shift) of every run of field bits (see Field.runs) go
+    into const tables that a single generic <arch>_encode routine walks.
+    Each instruction keeps a thin inline wrapper with the same signature as
+    its to_c_function(), so callers do not change. A field with a table is
+    looked up in the wrapper, and its run places the looked-up bits as they
+    are, so direct callers of <arch>_encode pass the table entry of such a
+    field instead of its value.
+
+    Args:
+        instructions (list(Instruction)): Solved instructions, all of the same width.
+
+    Raises:
+        RuntimeError: An instruction is unsolved or the instructions do not all have the same width.
+
+    Returns:
+        str: C source defining an enum of the instructions, the tables, the encode routine and the wrappers.
+    """
+    if len(instructions) == 0:
+        return ""
+
+    arch = instructions[0].arch
+    n_bits = instructions[0].n_bits
+    word_type = f"uint{n_bits}_t"
+    for instr in instructions:
+        if instr.opcode is None:
+            raise RuntimeError(f"Attempted to emit the unsolved instruction {instr.name}")
+        if instr.n_bits != n_bits:
+            raise RuntimeError(f"Cannot tabulate {instr.n_bits} bit {instr.name} together with {n_bits} bit instructions")
+    constants = [f"{instr.arch}_{instr.name}".upper() for instr in instructions]
+
+    # (arg, shift, mask) of every run, with the runs of each instruction contiguous
+    runs = []
+    # (opcode, first run, number of runs) of each instruction
+    entries = []
+    for instr in instructions:
+        first_run = len(runs)
+        for arg, field in enumerate(instr.fields):
+            if field.table is not None:
+                runs.append((arg, 0, field.instr_mask()))
+            for mask, shift in field.runs():
+                runs.append((arg, shift, mask))
+        entries.append((instr.opcode, first_run, len(runs) - first_run))
+    index_type = "uint16_t" if len(runs) < (1 << 16) else "uint32_t"
+
+    result = "".join(field_tables_c(instr) for instr in instructions)
+    result += f"enum {arch}_instruction {{\n"
+    for constant in constants:
+        result += f"    {constant},\n"
+    result += "};\n\n"
+
+    result += f"struct {arch}_run {{\n"
+    result += f"    {word_type} mask;  /* bits of the argument in the run */\n"
+    result += "    int8_t shift;  /* distance they move left (right if negative) */\n"
+    result += "    uint8_t arg;  /* index of the argument */\n"
+    result += "};\n\n"
+    result += f"struct {arch}_encoding {{\n"
+    result += f"    {word_type} opcode;\n"
+    result += f"    {index_type} first_run;\n"
+    result += f"    {index_type} n_runs;\n"
+    result += "};\n\n"
+
+    result += f"static const struct {arch}_run {arch}_runs[] = {{\n"
+    for arg, shift, mask in runs:
+        result += f"    {{0x{mask:x}, {shift}, {arg}}},\n"
+    if len(runs) == 0:
+        result += "    {0, 0, 0},\n"
+    result += "};\n\n"
+
+    result += f"static const struct {arch}_encoding {arch}_encodings[] = {{\n"
+    for constant, (opcode, first_run, n_runs) in zip(constants, entries):
+        result += f"    [{constant}] = {{0x{opcode:x}, {first_run}, {n_runs}}},\n"
+    result += "};\n\n"
+
+    # kept out of line so every wrapper shares one copy of the loop
+    result += "#if defined(__GNUC__)\n"
+    result += "__attribute__((noinline, unused))\n"
+    result += "#endif\n"
+    result += f"static {word_type} {arch}_encode(enum {arch}_instruction instr, const {word_type} *args) {{\n"
+    result += f"    const struct {arch}_encoding *encoding = &{arch}_encodings[instr];\n"
+    result += f"    const struct {arch}_run *run = &{arch}_runs[encoding->first_run];\n"
+    result += f"    {word_type} word = encoding->opcode;\n"
+    result += f"    for ({index_type} i = 0; i < encoding->n_runs; i++, run++) {{\n"
+    result += f"        {word_type} bits = args[run->arg] & run->mask;\n"
+    result += "        word |= run->shift >= 0 ? bits << run->shift : bits >> -run->shift;\n"
+    result += "    }\n"
+    result += "    return word;\n"
+    result += "}"
+
+    for constant, instr in zip(constants, instructions):
+        params = ", ".join(f"{word_type} {field.name}" for field in instr.fields)
+        result += f"\n\nstatic inline {word_type} {instr.arch}_{instr.name}({params}) {{\n"
+        if len(instr.fields) == 0:
+            result += f"    return 0x{instr.opcode:x};\n"
+        else:
+            args = [f"{field_table_name(instr, field)}[{field.name} & 0x{len(field.table) - 1:x}]" if field.table is not None else field.name
+                    for field in instr.fields]
+            result += f"    const {word_type} args[] = {{{', '.join(args)}}};\n"
+            result += f"    return {arch}_encode({constant}, args);\n"
+        result += "}"
+
+    return result
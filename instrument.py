@@ -0,0 +1,265 @@
+import contextlib
+import json
+import threading
+import time
+
+from assembler import Assembler
+
+# bump whenever the layout of the report written by write_report() changes
+REPORT_VERSION = 4
+
+class Profile:
+    """Timings and counters collected over a run of derive.py.
+
+    Times are wall clock seconds. The probes of many templates are
+    assembled together, so each template is charged a share of the time
+    taken to assemble each of its rounds, in proportion to its probes (see
+    RoundCounter); the members of a family are charged separately.
+    """
+
+    def __init__(self, config_name=None):
+        """Starts an empty profile.
+
+        Args:
+            config_name (str): The name of the profiled config, included in the report.
+        """
+        self.config_name = config_name
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        # {phase: seconds}
+        self.phases = {}
+        # {instr_name: {"seconds": float, "rounds": int, "probes": int}}, plus "family" (its first member) for families
+        self.templates = {}
+        # list of {"instruction": str, "assembly": str, "seconds": float, "check_seconds": float, "assemble_seconds": float}
+        self.tests = []
+        self.reused = 0
+        self.assemble_calls = 0
+        self.assembled_instructions = 0
+        self.assembler_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager adding the time spent in its body to a phase.
+
+        Args:
+            name (str): The name of the phase, e.g. "solve".
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def template_stats(self, instr_name):
+        """Returns the entry of a template in templates, creating it if needed."""
+        return self.templates.setdefault(instr_name, {"seconds": 0.0, "rounds": 0, "probes": 0})
+
+    def charge_round(self, probes, seconds):
+        """Charges the templates of a round of probes their share of the time taken to assemble it.
+
+        Args:
+            probes (dict(str, int)): The number of probes of each template in the round.
+            seconds (float): The time taken to assemble the round.
+        """
+        total = sum(probes.values())
+        with self.lock:
+            for instr_name, n_probes in probes.items():
+                stats = self.template_stats(instr_name)
+                stats["seconds"] += seconds * n_probes / total
+                stats["rounds"] += 1
+                stats["probes"] += n_probes
+
+    def record_family(self, members):
+        """Records that templates were solved as a family (see derive.probe_family).
+
+        Args:
+            members (list(str)): The names of the members, first member first.
+        """
+        with self.lock:
+            for instr_name in members:
+                self.template_stats(instr_name)["family"] = members[0]
+
+    def record_test(self, instr_name, assembly, check_seconds, assemble_seconds):
+        """Records the time taken by a test case.
+
+        The ground truths of the test cases are assembled in one batch, so
+        each test case is charged an even share of the batch.
+
+        Args:
+            instr_name (str): The name of the instruction under test.
+            assembly (str): The ground truth assembly of the test case.
+            check_seconds (float): The time taken to check the solved instruction against the ground truth.
+            assemble_seconds (float): The share of the time taken to assemble the batch.
+        """
+        self.tests.append({"instruction": instr_name, "assembly": assembly,
+                           "seconds": check_seconds + assemble_seconds,
+                           "check_seconds": check_seconds, "assemble_seconds": assemble_seconds})
+
+    def record_assemble(self, n_instructions, seconds):
+        """Records a call to the profiled assembler.
+
+        Args:
+            n_instructions (int): The number of instructions in the batch.
+            seconds (float): The time the call took.
+        """
+        with self.lock:
+            self.assemble_calls += 1
+            self.assembled_instructions += n_instructions
+            self.assembler_seconds += seconds
+
+    def report(self):
+        """Returns the profile as a JSON-serializable dict."""
+        return {"config": self.config_name,
+                "total_seconds": time.perf_counter() - self.start,
+                "phases": self.phases,
+                "assembler": {"calls": self.assemble_calls,
+                              "instructions": self.assembled_instructions,
+                              "seconds": self.assembler_seconds},
+                "cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+                "reused_templates": self.reused,
+                "templates": self.templates,
+                "tests": self.tests}
+
+    def summary(self, n=10):
+        """Formats a human-readable summary of the run and its slowest templates and tests.
+
+        Args:
+            n (int): The number of templates and tests to list.
+
+        Returns:
+            str: The summary.
+        """
+        lines = [f"Profile of {self.config_name}: {time.perf_counter() - self.start:.3f}s total"]
+        for name, seconds in self.phases.items():
+            lines.append(f"  {name:<10} {seconds:8.3f}s")
+        lines.append(f"  assembler: {self.assemble_calls} calls, {self.assembled_instructions} instructions, {self.assembler_seconds:.3f}s")
+        lines.append(f"  cache: {self.cache_hits} hits, {self.cache_misses} misses")
+
+        slowest = sorted(self.templates.items(), key=lambda item: -item[1]["seconds"])[:n]
+        if len(slowest) > 0:
+            lines.append("  slowest templates:")
+            for instr_name, stats in slowest:
+                lines.append(f"    {instr_name:<20} {stats['seconds']:8.3f}s  {stats['rounds']} rounds, {stats['probes']} probes")
+
+        slowest = sorted(self.tests, key=lambda test: -test["seconds"])[:n]
+        if len(slowest) > 0:
+            lines.append("  slowest tests:")
+            for test in slowest:
+                lines.append(f"    {test['assembly']:<30} {test['seconds']:8.6f}s  "
+                             f"({test['check_seconds']:.6f}s check, {test['assemble_seconds']:.6f}s assembly)")
+        return "\n".join(lines)
+
+class RoundCounter:
+    """Counts the probes each template adds to a round, and charges the round to a Profile once it is assembled."""
+
+    def __init__(self, profile):
+        """Starts counting the first round.
+
+        Args:
+            profile (Profile): The profile to charge.
+        """
+        self.profile = profile
+        self.probes = {}
+
+    def count(self, probes):
+        """Adds probes to the current round.
+
+        Args:
+            probes (dict(str, int)): The number of probes each template adds.
+        """
+        for instr_name, n_probes in probes.items():
+            if n_probes > 0:
+                self.probes[instr_name] = self.probes.get(instr_name, 0) + n_probes
+
+    def charge(self, seconds):
+        """Charges the current round to the profile and starts the next one.
+
+        Args:
+            seconds (float): The time taken to assemble the round.
+        """
+        if len(self.probes) > 0:
+            self.profile.charge_round(self.probes, seconds)
+        self.probes = {}
+
+def write_report(profiles, path):
+    """Writes the reports of the profiles of a run as JSON.
+
+    Args:
+        profiles (list(Profile)): The profile of each config of the run.
+        path (str): The file to write.
+    """
+    with open(path, "w") as f:
+        json.dump({"version": REPORT_VERSION,
+                   "configs": [profile.report() for profile in profiles]}, f, indent=1)
+
+class ProfiledAssembler(Assembler):
+    """Assembler that records the number and duration of the calls made to another assembler."""
+
+    def __init__(self, asm, profile):
+        """Wraps an assembler.
+
+        Args:
+            asm (Assembler): The assembler to profile.
+            profile (Profile): The profile to record calls in.
+        """
+        self.asm = asm
+        self.profile = profile
+
+    def assemble(self, instruction):
+        """Assembles a given instruction and returns the resulting binary.
+
+        Args:
+            instruction (str): The instruction to assemble.
+
+        Returns:
+            bytes: The assembled binary.
+        """
+        return self.assemble_many([instruction])[0]
+
+    def assemble_many(self, instructions):
+        """Assembles a list of instructions with the wrapped assembler, recording the call.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        start = time.perf_counter()
+        try:
+            return self.asm.assemble_many(instructions)
+        finally:
+            self.profile.record_assemble(len(instructions), time.perf_counter() - start)
+
+    async def assemble_many_async(self, instructions):
+        """Assembles a list of instructions with the wrapped assembler without blocking the event loop, recording the call.
+
+        Args:
+            instructions (list(str)): The instructions to assemble, one per line.
+
+        Returns:
+            list(bytes): The assembled binary of each instruction, in order.
+        """
+        start = time.perf_counter()
+        try:
+            return await self.asm.assemble_many_async(instructions)
+        finally:
+            self.profile.record_assemble(len(instructions), time.perf_counter() - start)
+
+    def clone(self, filepath):
+        """Creates a profiled clone of the wrapped assembler that records into the same profile."""
+        return ProfiledAssembler(self.asm.clone(filepath), self.profile)
+
+    def identity(self):
+        """Returns a string identifying everything that determines the assembled output."""
+        return self.asm.identity()
+
+    def cleanup(self):
+        """Cleans up the wrapped assembler."""
+        self.asm.cleanup()
+
+    def arch(self):
+        """Returns a string denoting the assembler architecture."""
+        return self.asm.arch()
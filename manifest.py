@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+
+from instruction import Instruction
+
+# bump whenever the manifest layout or the meaning of its keys changes
+MANIFEST_VERSION = 4
+
+class Manifest:
+    """Record of the instructions solved and tested by previous runs of a config.
+
+    Solved instructions are keyed by everything that determines them (the
+    assembler identity, instruction name, template and regex), and passed
+    test cases additionally by their arguments and assembly, so a rerun only
+    has to solve and test what changed.
+    """
+
+    def __init__(self, path):
+        """Loads a manifest, starting empty if it does not exist or is stale.
+
+        Args:
+            path (str): The manifest file.
+        """
+        self.path = path
+        # {template key: Instruction.to_dict()}
+        self.instructions = {}
+        # keys of passed test cases
+        self.passed = set()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.instructions = data["instructions"]
+                self.passed = set(data["passed"])
+
+    @staticmethod
+    def template_key(identity, instr_name, template, regex):
+        """Computes the key of a template.
+
+        Args:
+            identity (str): The Assembler.identity() of the assembler.
+            instr_name (str): The name of the instruction.
+            template (str): The template.
+            regex (str): The regular expression matching the template arguments.
+
+        Returns:
+            str: The key.
+        """
+        return hashlib.sha256(json.dumps([identity, instr_name, template, regex]).encode()).hexdigest()
+
+    @staticmethod
+    def test_key(template_key, args, assembly):
+        """Computes the key of a test case of the instruction with the given template key.
+
+        Args:
+            template_key (str): The Manifest.template_key() of the instruction under test.
+            args (dict(int)): The arguments of the test case.
+            assembly (str): The ground truth assembly of the test case.
+
+        Returns:
+            str: The key.
+        """
+        return hashlib.sha256(json.dumps([template_key, sorted(args.items()), assembly]).encode()).hexdigest()
+
+    def instruction(self, key):
+        """Returns the instruction solved for a template key, or None if it has not been solved."""
+        if key not in self.instructions:
+            return None
+        return Instruction.from_dict(self.instructions[key])
+
+    def save(self, solved, passed):
+        """Replaces the contents of the manifest and writes it out.
+
+        Entries for templates that are no longer in the config are dropped.
+
+        Args:
+            solved (dict(str, Instruction)): Map from template key to solved instruction.
+            passed (set(str)): Keys of the test cases that passed.
+        """
+        self.instructions = {key: instr.to_dict() for key, instr in solved.items()}
+        self.passed = set(passed)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION,
+                       "instructions": self.instructions,
+                       "passed": sorted(self.passed)}, f, indent=1)
+        os.replace(tmp_path, self.path)
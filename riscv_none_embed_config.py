@@ -1,7 +1,4 @@
-import os
-import subprocess
-
-from assembler import Assembler
+from assembler import GnuAssembler
 
 output_file = "./riscv-none-embed-insts.h"
 
@@ -32,68 +29,21 @@ test_cases = [
     ("nop", {}, "nop")
 ]
 
-class RiscVNoneEmbedAssembler(Assembler):
+class RiscVNoneEmbedAssembler(GnuAssembler):
     """riscv-none-embed assembler (for esp32-c3)"""
 
     def __init__(self, config_dict):
-        """Sets up an instance of an ArmNoneEabiAssembler.
+        """Sets up an instance of a RiscVNoneEmbedAssembler.
         
         Args:
             config_dict: A dictionary containing the assembler configuration.
         """
 
-        self.memmap = config_dict["memmap"]
-        self.asm_file = config_dict["filepath"] + ".S"
-        self.obj_file = config_dict["filepath"] + ".o"
-        self.bin_file = config_dict["filepath"] + ".bin"
-
-
-    def assemble(self, instruction):
-        """Assembles a given file and returns the resulting binary.
-
-        Args:
-            filename (str): The name of the file to assemble.
-
-        Returns:
-            bytes: The assembled binary.
-        """
-
-        # Create temporary assembly file
-        with open(self.asm_file, "w+") as f:
-            f.write(instruction + "\n")
-
-        
-        # Assemble the file
-        retcode = subprocess.call(["riscv-none-embed-gcc", "-march=rv32im", "-c", self.asm_file, "-o", self.obj_file])
-        if retcode != 0:
-            raise RuntimeError(f"Error assembling instruction: `{instruction}`")
-
-        # Link the object file into a binary
-        retcode = subprocess.call(["riscv-none-embed-objcopy", self.obj_file, "-O", "binary", self.bin_file])
-        if retcode != 0:
-            raise RuntimeError(f"Error objcopying: `{self.obj_file}`")
-
-        # Read the binary
-        with open(self.bin_file, "rb") as f:
-            binary = f.read()
-
-        if (len(binary) not in [4]):
-            raise RuntimeError(f"Expected 2 or 4 byte instruction but got {len(binary)} bytes!")
-
-        # convert from little endian
-        return bytes(reversed(binary))
-
-
-    def cleanup(self):
-        """Cleans up any temporary files created during the assembly process."""
-
-        os.remove(self.asm_file)
-        os.remove(self.obj_file)
-        os.remove(self.bin_file)
+        super().__init__(config_dict)
+        self.as_command = ["riscv-none-embed-gcc", "-march=rv32im", "-c", "-x", "assembler-with-cpp", "-"]
 
     def arch(self):
         """Returns a string denoting the assembler architecture."""
         return "riscv"
 
-asm = RiscVNoneEmbedAssembler({"memmap": "memmap",
-                            "filepath": "./test"})
+asm = RiscVNoneEmbedAssembler({"memmap": "memmap"})
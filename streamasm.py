@@ -0,0 +1,273 @@
+import argparse
+import importlib
+import re
+
+from assembler import Assembler
+from instrdb import InstructionDatabase
+
+# integer operand as written in assembly source: decimal, 0x hex or 0b binary, optionally signed
+INT_PATTERN = r"[-+]?(?:0[xX][0-9a-fA-F]+|0[bB][01]+|[0-9]+)"
+
+def parse_int(text):
+    """Parses an integer operand matched by INT_PATTERN.
+
+    Args:
+        text (str): The operand.
+
+    Returns:
+        int: Its value.
+    """
+    try:
+        return int(text, 0)
+    except ValueError:
+        # decimal with leading zeros, which int(text, 0) rejects
+        return int(text, 10)
+
+def template_pattern(template, matches):
+    """Builds a regular expression matching the lines a template can produce.
+
+    Operands become numbered groups. Where the template separates two words
+    (or operands) with whitespace, any amount of whitespace is required;
+    whitespace around punctuation is optional.
+
+    Args:
+        template (str): The template.
+        matches (list(re.Match)): The matched arguments of the template.
+
+    Returns:
+        str: The regular expression.
+    """
+    # (regex, is a word or operand, preceded by whitespace) of every token
+    tokens = []
+    last = 0
+    for match in matches + [None]:
+        end = len(template) if match is None else match.start()
+        for token in re.finditer(r"(\s*)(\w+|[^\w\s])", template[last:end]):
+            tokens.append((re.escape(token.group(2)), token.group(2)[0].isalnum() or token.group(2)[0] == "_", len(token.group(1)) > 0))
+        if match is not None:
+            tokens.append((f"({INT_PATTERN})", True, template[last:end][-1:].isspace()))
+            last = match.end()
+
+    pattern = ""
+    for i, (token, is_word, spaced) in enumerate(tokens):
+        if i > 0:
+            if is_word and tokens[i - 1][1]:
+                pattern += r"\s+" if spaced else ""
+            else:
+                pattern += r"\s*"
+        pattern += token
+    return pattern
+
+class TemplateAssembler(Assembler):
+    """Assembler for the subset of a config's syntax covered by its solved templates, without a toolchain.
+
+    Every template is compiled into a regular expression, and templates are
+    grouped by mnemonic so each line is only tried against the templates
+    that share its first word. Operands are checked against the width and
+    sign of their field and encoded with Instruction.compile(). Lines are
+    read and encoded lazily, so arbitrarily large sources can be streamed.
+    """
+
+    def __init__(self, templates, regex, instructions, byteorder="little", comment_prefixes=("//",)):
+        """Compiles the templates.
+
+        Args:
+            templates (list): List of (instr_name, template) tuples.
+            regex (str): The regular expression to use to match the template arguments.
+            instructions (dict(str, Instruction)): The solved instruction of each template.
+            byteorder (str): The byte order of the target, used when writing encodings out.
+            comment_prefixes (tuple(str)): Strings that start a comment running to the end of the line.
+
+        Raises:
+            RuntimeError: A template has no solved instruction.
+        """
+        self.byteorder = byteorder
+        self.comment_prefixes = comment_prefixes
+        self.arch_name = None
+        # {mnemonic: [(pattern, instruction, encoder, [(low, high) of each operand])]}
+        self.by_mnemonic = {}
+        # templates whose first word contains an operand, tried on every line
+        self.generic = []
+
+        for instr_name, template in templates:
+            if instr_name not in instructions:
+                raise RuntimeError(f"{instr_name} not found in solved instructions")
+            instr = instructions[instr_name]
+            self.arch_name = instr.arch
+
+            matches = list(re.finditer(regex, template))
+            ranges = []
+            for match in matches:
+                field_width = int(match.group(2))
+                if field_width < 0:
+                    ranges.append((-(1 << -field_width), (1 << -field_width) - 1))
+                else:
+                    ranges.append((0, (1 << field_width) - 1))
+            entry = (re.compile(template_pattern(template, matches), re.IGNORECASE), instr, instr.compile(), ranges)
+
+            mnemonic = template.split(None, 1)[0]
+            if any(match.start() < len(mnemonic) for match in matches):
+                self.generic.append(entry)
+            else:
+                self.by_mnemonic.setdefault(mnemonic.lower(), []).append(entry)
+
+    @classmethod
+    def from_config(cls, config, instructions=None, byteorder="little"):
+        """Builds the assembler of a config.
+
+        The config may define comment_prefixes (default ("//",)).
+
+        Args:
+            config (module): The config.
+            instructions (dict(str, Instruction)): The solved instructions, or None to load
+                them from the config's database_file.
+            byteorder (str): The byte order of the target.
+
+        Returns:
+            TemplateAssembler: The assembler.
+        """
+        if instructions is None:
+            with InstructionDatabase(config.database_file) as db:
+                instructions = db.load_all()
+        return cls(config.templates, config.regex, instructions, byteorder, getattr(config, "comment_prefixes", ("//",)))
+
+    def strip(self, line):
+        """Removes the comment and surrounding whitespace of a line."""
+        for prefix in self.comment_prefixes:
+            idx = line.find(prefix)
+            if idx >= 0:
+                line = line[:idx]
+        return line.strip()
+
+    def encode_line(self, line):
+        """Encodes one line of assembly.
+
+        The templates that match the line are tried in order, and the first
+        one that can encode its operands is used.
+
+        Args:
+            line (str): The line.
+
+        Raises:
+            RuntimeError: No template matches the line, or none of those that match can encode its operands.
+
+        Returns:
+            tuple(Instruction, int) | None: The instruction and its encoding, or None for
+                a blank or comment-only line.
+        """
+        line = self.strip(line)
+        if not line:
+            return None
+
+        candidates = self.by_mnemonic.get(line.split(None, 1)[0].lower(), [])
+        # the first reason a matching template could not encode the line, reported if none can
+        error = None
+        for pattern, instr, encoder, ranges in candidates + self.generic:
+            match = pattern.fullmatch(line)
+            if match is None:
+                continue
+            values = [parse_int(text) for text in match.groups()]
+            for value, (low, high) in zip(values, ranges):
+                if not low <= value <= high:
+                    error = error or RuntimeError(f"`{line}`: operand {value} out of range [{low}, {high}]")
+                    break
+            else:
+                try:
+                    return instr, encoder(*values)
+                except KeyError:
+                    # a field with a table (see Field.table) that cannot encode its value
+                    error = error or RuntimeError(f"`{line}`: operands {values} cannot be encoded")
+        if error is not None:
+            raise error
+        raise RuntimeError(f"`{line}` does not match any template")
+
+    def iter_encodings(self, lines):
+        """Encodes lines of assembly lazily.
+
+        Args:
+            lines (iterable(str)): The source, e.g. an open text file.
+
+        Raises:
+            RuntimeError: A line cannot be assembled (the error names its line number).
+
+        Yields:
+            tuple(Instruction, int): The instruction and encoding of each non-blank line.
+        """
+        for line_no, line in enumerate(lines, 1):
+            try:
+                result = self.encode_line(line)
+            except RuntimeError as error:
+                raise RuntimeError(f"line {line_no}: {error}") from None
+            if result is not None:
+                yield result
+
+    def assemble_stream(self, lines, out, chunk_size=1 << 16):
+        """Assembles lines of assembly into a binary.
+
+        Args:
+            lines (iterable(str)): The source, e.g. an open text file.
+            out (bytearray | file): Where the machine code goes, in the target byte order:
+                appended to a bytearray, or written to a binary file in chunks.
+            chunk_size (int): The number of bytes buffered before each write to a file.
+
+        Returns:
+            int: The number of instructions assembled.
+        """
+        byteorder = self.byteorder
+        buffer = out if isinstance(out, bytearray) else bytearray()
+        count = 0
+        for instr, encoding in self.iter_encodings(lines):
+            buffer += (encoding & ((1 << instr.n_bits) - 1)).to_bytes(instr.n_bits // 8, byteorder)
+            count += 1
+            if buffer is not out and len(buffer) >= chunk_size:
+                out.write(buffer)
+                buffer.clear()
+        if buffer is not out and len(buffer) > 0:
+            out.write(buffer)
+        return count
+
+    def assemble_file(self, source_path, output_path):
+        """Assembles a source file into a raw binary file.
+
+        Args:
+            source_path (str): The assembly source.
+            output_path (str): The binary to write.
+
+        Returns:
+            int: The number of instructions assembled.
+        """
+        with open(source_path) as source, open(output_path, "wb") as out:
+            return self.assemble_stream(source, out)
+
+    def assemble(self, instruction):
+        """Assembles a given instruction and returns the resulting binary.
+
+        Args:
+            instruction (str): The instruction to assemble.
+
+        Returns:
+            bytes: The encoding (big endian, like the other assemblers).
+        """
+        instr, encoding = self.encode_line(instruction)
+        return (encoding & ((1 << instr.n_bits) - 1)).to_bytes(instr.n_bits // 8, "big")
+
+    def cleanup(self):
+        """Nothing to clean up: no temporary files are created."""
+        pass
+
+    def arch(self):
+        """Returns a string denoting the assembler architecture."""
+        return self.arch_name
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assemble a source file with the solved templates of a config, without a toolchain.")
+    parser.add_argument("config", help="The configuration python file to use (without .py); it must define database_file.")
+    parser.add_argument("source", help="The assembly source, one instruction per line.")
+    parser.add_argument("output", help="The raw binary to write.")
+    parser.add_argument("--big-endian", action="store_true", help="Write the encodings big endian (default: little endian).")
+    args = parser.parse_args()
+
+    config = importlib.import_module(args.config)
+    asm = TemplateAssembler.from_config(config, byteorder="big" if args.big_endian else "little")
+    count = asm.assemble_file(args.source, args.output)
+    print(f"Assembled {count} instructions to {args.output}")